@@ -0,0 +1,103 @@
+"""
+Per-message cost of abbreviation normalization as the dictionary grows.
+
+Run from the project root:
+    python -m benchmarks.bench_normalizer
+"""
+import json
+import random
+import time
+
+from utils.normalizer import AbbreviationNormalizer, legacy_normalize
+
+SIZES = [230, 1000, 5000, 10000]
+TIME_BUDGET = 0.5  # seconds spent timing each (engine, size) pair
+
+# Dictionaries where a phrase meets an expansion's edge or another phrase
+EDGE_CASES = [
+    ({"hn": "hôm nay", "nay đi": "bây giờ đi"}, "hn đi"),
+    ({"k": "nay", "a nay": "a"}, "a k"),
+    ({"x": "", "a b": "c"}, "a x b"),
+    ({"bít hôm": "b", "bít bít": "a đi"}, "hn bít bít hôm hôm"),
+    ({"a đi": "hn hn", "nay a": "b k"}, "a nay a đi bít"),
+]
+FUZZ_WORDS = ["hn", "nay", "đi", "Hôm", "k", "bít", "a", "b"]
+
+
+def load_messages():
+    with open("data/logs.json", "r", encoding="utf-8") as f:
+        logs = json.load(f)
+    return [line.split(": ", 1)[1] for lines in logs.values() for line in lines if ": " in line]
+
+
+def grow_dictionary(base, size):
+    abbreviations = dict(base)
+    i = 0
+    while len(abbreviations) < size:
+        abbreviations[f"xq{i}"] = f"từ số {i}"
+        i += 1
+    return abbreviations
+
+
+def check_equivalence(base, messages, fuzz=2000, seed=0):
+    """
+    Asserts the compiled normalizer matches legacy_normalize on the logged
+    messages, the edge cases and random small dictionaries.
+    """
+    cases = [(base, message) for message in messages] + EDGE_CASES
+    rng = random.Random(seed)
+    for _ in range(fuzz):
+        abbreviations = {
+            " ".join(rng.choices(FUZZ_WORDS, k=rng.randint(1, 3))):
+                " ".join(rng.choices(FUZZ_WORDS, k=rng.randint(0, 3)))
+            for _ in range(rng.randint(1, 5))
+        }
+        cases.append((abbreviations, " ".join(rng.choices(FUZZ_WORDS, k=rng.randint(1, 6)))))
+
+    for abbreviations, text in cases:
+        expected = legacy_normalize(text, abbreviations)
+        actual = AbbreviationNormalizer(abbreviations).normalize(text)
+        assert actual == expected, f"{abbreviations} {text!r}: {actual!r} != {expected!r}"
+    return len(cases)
+
+
+def time_per_message(func, messages):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for message in messages:
+            func(message)
+        calls += len(messages)
+        elapsed = time.perf_counter() - start
+        if elapsed >= TIME_BUDGET:
+            return elapsed / calls
+
+
+def main():
+    with open("data/viettat.json", "r", encoding="utf-8") as f:
+        base = json.load(f)
+    messages = load_messages()
+
+    print(f"{len(messages)} sample messages from data/logs.json")
+    print(f"{check_equivalence(base, messages)} cases match legacy_normalize")
+    print(f"{'entries':>8} {'build ms':>10} {'legacy us/msg':>15} {'compiled us/msg':>17} {'speedup':>9}")
+    for size in SIZES:
+        abbreviations = grow_dictionary(base, size)
+
+        start = time.perf_counter()
+        normalizer = AbbreviationNormalizer(abbreviations)
+        build = time.perf_counter() - start
+
+        for message in messages:
+            assert normalizer.normalize(message) == legacy_normalize(message, abbreviations)
+
+        legacy = time_per_message(lambda m: legacy_normalize(m, abbreviations), messages)
+        compiled = time_per_message(normalizer.normalize, messages)
+        print(
+            f"{size:>8} {build * 1000:>10.1f} {legacy * 1e6:>15.1f} "
+            f"{compiled * 1e6:>17.2f} {legacy / compiled:>8.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
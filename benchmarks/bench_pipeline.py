@@ -0,0 +1,198 @@
+"""
+Offline per-stage and end-to-end benchmark of the chat text pipeline.
+
+Runs ChatbotHandler against fake Telegram updates and a stub LLM inside a
+scratch copy of data/, so nothing real is read, written or sent.
+
+Run from the project root:
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --json bench_output.json --quick
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_normalizer import grow_dictionary
+from benchmarks.bench_splitter import make_reply
+from benchmarks.fakes import FakeUpdate, StubLLM
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DICT_SIZES = [230, 1000, 10000]
+HISTORY_TURNS = [10, 40, 200]
+REPLY_SIZES = [500, 4000, 50000]
+USER_COUNTS = [10, 1000, 10000]
+E2E_USERS = [1, 100, 1000]
+
+
+def prepare_sandbox():
+    """
+    Scratch working directory with copies of the config the handler reads.
+    Must run before handlers/utils are imported: their globals open data/ relative to cwd.
+    """
+    sandbox = tempfile.mkdtemp(prefix="bench_pipeline_")
+    shutil.copytree(os.path.join(ROOT, "data", "profiles"), os.path.join(sandbox, "data", "profiles"))
+    shutil.copy(os.path.join(ROOT, "data", "viettat.json"), os.path.join(sandbox, "data", "viettat.json"))
+    with open(os.path.join(sandbox, "api_keys.json"), "w") as f:
+        json.dump({
+            "cerebras_api_keys": ["bench-key-1", "bench-key-2"],
+            "rate_limits": {"requests_per_minute": 10**9, "tokens_per_minute": 10**12},
+        }, f)
+
+    os.environ.update({"COALESCE_WINDOW": "0", "STREAM_REPLIES": "0", "RESPONSE_CACHE": "0"})
+    os.chdir(sandbox)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    return sandbox
+
+
+def timeit(func, budget):
+    """
+    Seconds per call, repeating until `budget` seconds have been spent.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            return elapsed / calls
+
+
+async def atimeit(func, budget):
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        await func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            return elapsed / calls
+
+
+class Results:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, stage, param, value, seconds):
+        self.rows.append({"stage": stage, "param": param, "value": value, "us_per_op": round(seconds * 1e6, 2)})
+        print(f"{stage:<16} {param:<14} {value:>8} {seconds * 1e6:>12.1f} us")
+
+
+def bench_stages(handler, results, budget):
+    from utils.cache import ConversationCache
+    from utils.splitter import split_message
+    from utils.storage import ConversationStore, JsonDB
+
+    base = dict(handler.abbreviations)
+    message = "ê mày ơi hn đi đâu vl, k bít thật à, clgt ae ơi"
+    for size in DICT_SIZES:
+        handler.abbreviations = grow_dictionary(base, size)
+        results.add("normalize", "entries", size, timeit(lambda: handler.normalize_input(message), budget))
+    handler.abbreviations = base
+
+    results.add("system_prompt", "profile", 0, timeit(handler.get_system_prompt, budget))
+
+    store = ConversationStore(path="data/bench_history.db")
+    for turns in HISTORY_TURNS:
+        user = f"history-{turns}"
+        store.append_many([(user, "user" if i % 2 == 0 else "assistant", make_reply(300, seed=i), None)
+                           for i in range(turns)])
+        cache = ConversationCache(store, window=turns)
+        cache.last(user)
+
+        def build():
+            past = cache.last(user)
+            handler.history_builder.build(user, past, handler.model_name)
+
+        results.add("history", "turns", turns, timeit(build, budget))
+        results.add("history_miss", "turns", turns, timeit(lambda: store.last(user, turns), budget))
+    store.close()
+
+    for size in REPLY_SIZES:
+        reply = "<think>" + make_reply(size // 4, seed=1) + "</think>" + make_reply(size)
+        results.add("clean", "chars", size, timeit(lambda: handler.clean_response(reply), budget))
+        results.add("split", "chars", size, timeit(lambda: split_message(reply), budget))
+
+    # Cost of the old whole-file logs.json round trip vs the one-time migration
+    legacy = JsonDB("data/bench_logs")
+    for users in USER_COUNTS:
+        logs = {str(u): [f"User: xin chào {u}", "Bot: " + make_reply(100, seed=u)] * 5 for u in range(users)}
+        legacy.save("logs", logs)
+
+        def roundtrip():
+            legacy.save("logs", legacy.load("logs"))
+
+        results.add("logs_json_rw", "users", users, timeit(roundtrip, budget))
+
+        store = ConversationStore(path=f"data/bench_migrate_{users}.db")
+        start = time.perf_counter()
+        store.migrate_from_json(legacy, "logs")
+        results.add("migrate", "users", users, time.perf_counter() - start)
+        store.close()
+
+
+async def bench_end_to_end(handler, results, budget):
+    handler.llm = StubLLM(make_reply(600, seed=7))
+    texts = ["alo", "ê mày ơi hn đi đâu vl", "viết code python cho tao", "k bít thật à clgt"]
+
+    for users in E2E_USERS:
+        counter = [0]
+
+        async def one_message():
+            i = counter[0]
+            counter[0] += 1
+            update = FakeUpdate(user_id=10_000 + i % users, text=texts[i % len(texts)])
+            await handler._process_chat(update, handler.normalize_input(update.message.text))
+
+        results.add("end_to_end", "users", users, await atimeit(one_message, budget))
+
+    await handler.history.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    parser.add_argument("--budget", type=float, default=0.5, help="seconds spent timing each case")
+    parser.add_argument("--quick", action="store_true", help="shorter timing budget (0.1s per case)")
+    args = parser.parse_args()
+    budget = 0.1 if args.quick else args.budget
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    cwd = os.getcwd()
+    sandbox = prepare_sandbox()
+    try:
+        from handlers.chatbot import ChatbotHandler
+        from utils.logger import log
+        log.disabled = True
+
+        handler = ChatbotHandler()
+        handler.warm_up()
+        results = Results()
+        print(f"{'stage':<16} {'param':<14} {'value':>8} {'time/op':>15}")
+        bench_stages(handler, results, budget)
+        asyncio.run(bench_end_to_end(handler, results, budget))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "budget": budget,
+                "results": results.rows,
+            }, f, indent=2)
+        print(f"Results written to {json_path}")
+
+
+if __name__ == "__main__":
+    main()
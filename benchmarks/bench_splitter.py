@@ -0,0 +1,95 @@
+"""
+Reply splitting on large replies: old paragraph/line splitter vs utils.splitter.
+
+Run from the project root:
+    python -m benchmarks.bench_splitter
+"""
+import random
+import time
+
+from utils.splitter import split_message, utf16_len
+
+SIZES = [4_000, 20_000, 50_000]
+TIME_BUDGET = 0.5
+
+
+def legacy_split(text, max_length=4000):
+    # Copy of the splitting part of the old ChatbotHandler._send_split_message
+    if len(text) <= max_length:
+        return [text]
+    parts = []
+    current_part = ""
+    for para in text.split('\n\n'):
+        if len(current_part) + len(para) + 2 > max_length:
+            if current_part:
+                parts.append(current_part.strip())
+                current_part = para
+            else:
+                for line in para.split('\n'):
+                    if len(current_part) + len(line) + 1 > max_length:
+                        if current_part:
+                            parts.append(current_part.strip())
+                        current_part = line
+                    else:
+                        current_part += ("\n" if current_part else "") + line
+        else:
+            current_part += ("\n\n" if current_part else "") + para
+    if current_part:
+        parts.append(current_part.strip())
+    return parts
+
+
+def make_reply(size, emoji=True, seed=0):
+    """
+    Vietnamese-looking text with paragraphs, short lines, emoji and the odd
+    very long line without breaks (what breaks the old splitter).
+    """
+    rng = random.Random(seed)
+    words = ["mày", "tao", "được", "không", "vãi", "code", "python", "ngu", "ok"]
+    if emoji:
+        words += ["😂", "🔥"]
+    parts = []
+    length = 0
+    while length < size:
+        kind = rng.random()
+        if kind < 0.05:
+            piece = " ".join(rng.choice(words) for _ in range(1500)) + ". "
+        elif kind < 0.3:
+            piece = "\n\n"
+        elif kind < 0.5:
+            piece = "\n"
+        else:
+            piece = " ".join(rng.choice(words) for _ in range(rng.randint(5, 30))) + ". "
+        parts.append(piece)
+        length += len(piece)
+    return "".join(parts)[:size]
+
+
+def time_call(func, text):
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < TIME_BUDGET:
+        func(text)
+        calls += 1
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    print(f"{'chars':>7} {'emoji':>6} {'legacy us':>10} {'over limit':>11} {'new us':>9} {'chunks':>7} {'max utf16':>10}")
+    for size, emoji in [(size, emoji) for emoji in (False, True) for size in SIZES]:
+        text = make_reply(size, emoji)
+        legacy_parts = legacy_split(text)
+        parts = split_message(text)
+        over = sum(1 for p in legacy_parts if utf16_len(p) > 4096)
+        assert all(utf16_len(p) <= 4000 for p in parts)
+
+        legacy = time_call(legacy_split, text)
+        new = time_call(split_message, text)
+        print(
+            f"{size:>7} {str(emoji):>6} {legacy * 1e6:>10.1f} {over:>11} {new * 1e6:>9.1f} "
+            f"{len(parts):>7} {max(utf16_len(p) for p in parts):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Cold-start benchmark: import time of the bot and time to the first answered update.
+
+Every run is a fresh interpreter inside a scratch copy of data/ (see
+bench_pipeline) with a stub LLM, so nothing real is read, written or sent.
+"deferred" is the normal startup (keys, dictionary and history load in the
+background while the first message waits for readiness); "eager" runs
+warm_up() before starting, like the bot used to.
+
+Run from the project root:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULES = ["cerebras.cloud.sdk", "flask", "psutil", "aiohttp"]
+MODES = ["deferred", "eager"]
+
+
+def child(mode):
+    start = time.perf_counter()
+    import asyncio
+    import main
+    imported = time.perf_counter()
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    from benchmarks.fakes import FakeContext, FakeUpdate, StubLLM
+    from utils.logger import log
+    log.disabled = True
+
+    app, chatbot = main.build_application(updater=False)
+    chatbot.llm = StubLLM("xin chào")
+    if mode == "eager":
+        chatbot.warm_up()
+    built = time.perf_counter()
+
+    async def first_update():
+        await chatbot.start()
+        started = time.perf_counter()
+        update = FakeUpdate(user_id=1, text="alo")
+        await chatbot.on_message(update, FakeContext())
+        answered = time.perf_counter()
+        assert update.message.replies, "first update was not answered"
+        await chatbot.shutdown()
+        return started, answered
+
+    started, answered = asyncio.run(first_update())
+    print(json.dumps({
+        "import_ms": (imported - start) * 1e3,
+        "build_ms": (built - imported) * 1e3,
+        "listening_ms": (started - start) * 1e3,
+        "first_reply_ms": (answered - start) * 1e3,
+        "heavy_imports": heavy,
+    }))
+
+
+def run_once(mode, sandbox, env):
+    launched = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", f"from benchmarks.bench_startup import child; child({mode!r})"],
+        cwd=sandbox, env=env, capture_output=True, text=True, check=True,
+    )
+    row = json.loads(out.stdout.strip().splitlines()[-1])
+    row["process_ms"] = (time.perf_counter() - launched) * 1e3
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per mode (median is reported)")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    from benchmarks.bench_pipeline import ROOT, prepare_sandbox
+    cwd = os.getcwd()
+    sandbox = prepare_sandbox()
+    os.chdir(cwd)
+    env = dict(os.environ, TELEGRAM_TOKEN="123456:bench", PYTHONPATH=ROOT)
+
+    results = {}
+    try:
+        print(f"{'mode':<10} {'import':>9} {'build':>9} {'listening':>10} {'1st reply':>10} {'process':>9}  heavy imports")
+        for mode in MODES:
+            # Fresh data each time so the history migration is part of every run
+            shutil.rmtree(os.path.join(sandbox, "data"), ignore_errors=True)
+            rows = []
+            for _ in range(args.runs):
+                shutil.copytree(os.path.join(ROOT, "data", "profiles"), os.path.join(sandbox, "data", "profiles"),
+                                dirs_exist_ok=True)
+                shutil.copy(os.path.join(ROOT, "data", "viettat.json"), os.path.join(sandbox, "data", "viettat.json"))
+                rows.append(run_once(mode, sandbox, env))
+            median = {key: statistics.median(r[key] for r in rows) for key in rows[0] if key.endswith("_ms")}
+            median["heavy_imports"] = rows[0]["heavy_imports"]
+            results[mode] = median
+            print(
+                f"{mode:<10} {median['import_ms']:>7.0f}ms {median['build_ms']:>7.0f}ms "
+                f"{median['listening_ms']:>8.0f}ms {median['first_reply_ms']:>8.0f}ms "
+                f"{median['process_ms']:>7.0f}ms  {', '.join(median['heavy_imports']) or '-'}"
+            )
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(),
+                       "runs": args.runs, "results": results}, f, indent=2)
+        print(f"Results written to {json_path}")
+
+
+if __name__ == "__main__":
+    main()
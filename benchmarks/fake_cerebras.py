@@ -0,0 +1,131 @@
+"""
+Local OpenAI/Cerebras-compatible chat completion server for load tests.
+
+Latency, a slow tail, streaming speed, random 429s, per-key rate limits and keys that
+always answer 401 are configurable. Point the bot at it with
+CEREBRAS_BASE_URL=http://127.0.0.1:<port>.
+"""
+import asyncio
+import collections
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+from benchmarks.bench_splitter import make_reply
+
+
+class FakeCerebras:
+    def __init__(self, latency=0.8, jitter=0.5, tokens_per_second=300, reply_chars=400, error_rate=0.0,
+                 bad_keys=(), requests_per_minute=None, retry_after=2, slow_rate=0.0, slow_latency=10.0,
+                 model_latency=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.reply_chars = reply_chars
+        self.error_rate = error_rate
+        self.bad_keys = set(bad_keys)
+        self.requests_per_minute = requests_per_minute
+        self.retry_after = retry_after
+        # Fraction of calls that take `slow_latency` instead, like an overloaded backend
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.model_latency = dict(model_latency or {})  # model -> mean latency instead of `latency`
+        self.rng = random.Random(seed)
+        # key -> Counter(requests, ok, slow, 429, 401)
+        self.stats = collections.defaultdict(collections.Counter)
+        self.models = collections.Counter()  # requests per model
+        self._recent = collections.defaultdict(collections.deque)
+        self._ids = itertools.count(1)
+        self._runner = None
+
+    async def start(self, port=0):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _over_limit(self, key):
+        if not self.requests_per_minute:
+            return False
+        now = time.monotonic()
+        recent = self._recent[key]
+        while recent and now - recent[0] > 60:
+            recent.popleft()
+        if len(recent) >= self.requests_per_minute:
+            return True
+        recent.append(now)
+        return False
+
+    async def _handle(self, request):
+        key = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        stats = self.stats[key]
+        stats["requests"] += 1
+        if key in self.bad_keys:
+            stats["401"] += 1
+            return web.json_response(
+                {"message": "Wrong API Key", "type": "invalid_request_error", "code": "wrong_api_key"}, status=401)
+        if self._over_limit(key) or self.rng.random() < self.error_rate:
+            stats["429"] += 1
+            return web.json_response(
+                {"message": "Requests per minute limit exceeded", "type": "too_many_requests_error"},
+                status=429, headers={"Retry-After": str(self.retry_after)})
+
+        body = await request.json()
+        self.models[body.get("model")] += 1
+        latency = self.model_latency.get(body.get("model"), self.latency)
+        latency *= 1 + self.jitter * (self.rng.random() * 2 - 1)
+        if self.rng.random() < self.slow_rate:
+            stats["slow"] += 1
+            latency = self.slow_latency
+        await asyncio.sleep(max(0.0, latency))
+        max_chars = body.get("max_tokens", 10**6) * 4
+        think = not body["messages"][-1].get("content", "").endswith("/no_think")
+        reply = self._reply(think)[:max_chars]
+        prompt_tokens = sum(len(m.get("content") or "") for m in body["messages"]) // 3
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply) // 4,
+                 "total_tokens": prompt_tokens + len(reply) // 4}
+        stats["ok"] += 1
+
+        base = {"id": f"chatcmpl-{next(self._ids)}", "created": int(time.time()), "model": body.get("model"),
+                # The SDK tells chunks from full responses by this and `object`
+                "system_fingerprint": "fp_fake"}
+        if not body.get("stream"):
+            return web.json_response({
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        step = 16  # ~4 tokens per chunk
+        try:
+            for i in range(0, len(reply), step):
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": reply[i:i + step]}, "finish_reason": None}]}
+                await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                await asyncio.sleep(step / 4 / self.tokens_per_second)
+            final = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+            await response.write_eof()
+        except ConnectionResetError:
+            pass  # the bot closed the stream early (cancelled chat, shutdown)
+        return response
+
+    def _reply(self, think=True):
+        seed = self.rng.randrange(1 << 30)
+        size = max(20, int(self.rng.gauss(self.reply_chars, self.reply_chars / 3)))
+        # Qwen answers with a thinking block first (empty after /no_think); the bot strips it
+        thoughts = make_reply(80, emoji=False, seed=seed) if think else ""
+        return f"<think>{thoughts}</think>\n{make_reply(size, seed=seed)}"
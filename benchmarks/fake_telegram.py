@@ -0,0 +1,171 @@
+"""
+Local stand-in for the Telegram Bot API, enough of it for the unmodified bot
+to poll, reply, edit and send chat actions.
+
+    server = FakeTelegram(on_send=callback)
+    port = await server.start()
+    # run the bot with TELEGRAM_API_URL=http://127.0.0.1:<port>
+    server.push_message(chat_id, user_id, "alo")
+"""
+import asyncio
+import collections
+import itertools
+import json
+import math
+import time
+
+from aiohttp import web
+
+# Form fields PTB sends JSON-encoded; everything else is a plain string
+JSON_FIELDS = {"reply_parameters", "reply_markup", "allowed_updates", "entities", "link_preview_options"}
+INT_FIELDS = {"chat_id", "message_id", "offset", "limit", "timeout"}
+# Methods that just need an OK
+TRUE_METHODS = {"sendChatAction", "deleteMessage", "deleteWebhook", "setWebhook", "setMyCommands", "close", "logOut"}
+# Methods that count against flood control
+FLOOD_METHODS = {"sendMessage", "editMessageText", "deleteMessage"}
+# Flood limits when enabled: (max requests, per seconds)
+GLOBAL_LIMIT = (30, 1.0)
+PRIVATE_LIMIT = (3, 1.0)
+GROUP_LIMIT = (20, 60.0)
+
+
+class FakeTelegram:
+    """
+    Queues pushed messages as updates for getUpdates and records what the bot sends.
+    `on_send(method, params, at)` is called for sendMessage and editMessageText.
+    With `flood_control`, sends over Telegram's usual limits get a 429 with retry_after.
+    """
+
+    def __init__(self, on_send=None, flood_control=False):
+        self.on_send = on_send
+        self.flood_control = flood_control
+        self.flooded = collections.Counter()  # method -> 429 answers
+        self._sent = collections.defaultdict(collections.deque)  # chat_id or None (global) -> send times
+        self.calls = collections.Counter()
+        self.polling = asyncio.Event()  # set on the bot's first getUpdates
+        self.me = {"id": 10**9, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot"}
+        self._updates = collections.deque()
+        self._arrived = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._chats = {}
+        self._runner = None
+
+    def push_message(self, chat_id, user_id, text):
+        """
+        Queues a text message from `user_id`; negative chat ids are groups. Returns its message_id.
+        """
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = {"id": chat_id, "type": "private" if chat_id > 0 else "group"}
+            if chat_id < 0:
+                chat["title"] = f"Group {-chat_id}"
+            else:
+                chat["first_name"] = f"user{chat_id}"
+            self._chats[chat_id] = chat
+        message_id = next(self._message_ids)
+        self._updates.append({
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": chat,
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                "text": text,
+            },
+        })
+        self._arrived.set()
+        return message_id
+
+    async def start(self, port=0):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _handle(self, request):
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls[method] += 1
+        retry_after = self._flood_wait(method, params.get("chat_id"))
+        if retry_after:
+            self.flooded[method] += 1
+            return web.json_response({
+                "ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+        if method == "getUpdates":
+            result = await self._get_updates(params)
+        elif method == "getMe":
+            result = self.me
+        elif method in ("sendMessage", "editMessageText"):
+            result = self._message(method, params)
+        elif method in TRUE_METHODS:
+            result = True
+        else:
+            return web.json_response({"ok": False, "error_code": 404, "description": "Not Found"}, status=404)
+        return web.json_response({"ok": True, "result": result})
+
+    def _flood_wait(self, method, chat_id):
+        """
+        Whole seconds to wait when this send is over a limit, else 0 (and the send is counted).
+        """
+        if not self.flood_control or method not in FLOOD_METHODS or chat_id is None:
+            return 0
+        now = time.monotonic()
+        limits = [(None, GLOBAL_LIMIT), (chat_id, PRIVATE_LIMIT if chat_id > 0 else GROUP_LIMIT)]
+        for key, (count, period) in limits:
+            sent = self._sent[key]
+            while sent and now - sent[0] > period:
+                sent.popleft()
+            if len(sent) >= count:
+                return max(1, math.ceil(period - (now - sent[0])))
+        for key, _ in limits:
+            self._sent[key].append(now)
+        return 0
+
+    async def _params(self, request):
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            if key in JSON_FIELDS:
+                value = json.loads(value)
+            elif key in INT_FIELDS:
+                value = int(value)
+            params[key] = value
+        return params
+
+    async def _get_updates(self, params):
+        offset = params.get("offset", 0)
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+        self.polling.set()
+        if not self._updates:
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), params.get("timeout", 0))
+            except asyncio.TimeoutError:
+                pass
+        limit = params.get("limit", 100)
+        return list(itertools.islice(self._updates, limit))
+
+    def _message(self, method, params):
+        if self.on_send:
+            self.on_send(method, params, time.monotonic())
+        chat_id = params["chat_id"]
+        message_id = params.get("message_id") or next(self._message_ids)
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": self._chats.get(chat_id, {"id": chat_id, "type": "private"}),
+            "from": self.me,
+            "text": params.get("text", ""),
+        }
@@ -0,0 +1,111 @@
+"""
+Offline stand-ins for the Telegram update objects and the LLM client, just
+enough of their surface for ChatbotHandler to run without network access.
+"""
+import itertools
+from types import SimpleNamespace
+
+_message_ids = itertools.count(1)
+
+
+class FakeChat:
+    def __init__(self, chat_id, type="private"):
+        self.id = chat_id
+        self.type = type
+        self.actions = 0
+
+    async def send_action(self, action):
+        self.actions += 1
+
+
+class FakeMessage:
+    def __init__(self, chat, text="", user=None):
+        self.message_id = next(_message_ids)
+        self.chat = chat
+        self.text = text
+        self.from_user = user
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        reply = FakeMessage(self.chat, text)
+        self.replies.append(reply)
+        return reply
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+        return self
+
+    async def delete(self):
+        return True
+
+
+class FakeUpdate:
+    def __init__(self, user_id, text, chat_id=None, chat_type="private"):
+        self.effective_user = SimpleNamespace(id=user_id, first_name=f"user{user_id}", username=None)
+        self.effective_chat = FakeChat(chat_id if chat_id is not None else user_id, chat_type)
+        self.message = FakeMessage(self.effective_chat, text, self.effective_user)
+
+
+class FakeContext:
+    """
+    The handler context: just the bot, which EngagementPolicy checks mentions against.
+    """
+
+    def __init__(self, bot_id=1_000_000, username="bench_bot", first_name="Bench"):
+        self.bot = SimpleNamespace(id=bot_id, username=username, first_name=first_name)
+        self.args = []
+
+
+class StubLLM:
+    """
+    Drop-in for LLMBackend that answers instantly with a canned reply.
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    def client(self, api_key):
+        return self
+
+    async def acquire(self, timeout=None):
+        pass
+
+    def release(self):
+        pass
+
+    async def complete(self, messages, api_key, model=None, stream=False, **params):
+        self.calls += 1
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 3
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(self.reply) // 3,
+                                total_tokens=prompt_tokens + len(self.reply) // 3)
+        if stream:
+            return StubStream(self._stream(usage))
+        message = SimpleNamespace(content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    async def _stream(self, usage, size=40):
+        for i in range(0, len(self.reply), size):
+            delta = SimpleNamespace(content=self.reply[i:i + size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    async def close(self):
+        pass
+
+
+class StubStream:
+    """
+    Async iterator with the close() of the SDK's AsyncStream.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self.chunks
+
+    async def close(self):
+        self.closed = True
+        await self.chunks.aclose()
@@ -0,0 +1,434 @@
+"""
+End-to-end load test: the unmodified `python main.py` against local fakes of
+the Telegram Bot API and the Cerebras completion API.
+
+Synthetic private-chat users hold closed-loop conversations (send, wait for
+the reply, think, send again) and group members chat open-loop, all using
+user lines from data/logs.json as seed text. A --mention-rate share of group
+messages @mention the bot; only those are expected to get a reply. The bot runs in a scratch copy
+of data/ with fake API keys, so nothing real is read, written or sent.
+
+Reports throughput, p50/p95/p99 reply latency, busy/error replies, what the
+fake LLM saw per key (429s, 401s) together with the bot's key rotation
+metrics, and the bot's memory growth.
+
+Run from the project root:
+    python -m benchmarks.loadtest --users 200 --groups 10 --duration 60
+    python -m benchmarks.loadtest --keys 4 --bad-keys 1 --error-rate 0.05 --json load.json
+    python -m benchmarks.loadtest --env WORKERS=4 --env MAX_CONCURRENT_CHATS=32
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import psutil
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks.fake_cerebras import FakeCerebras
+from benchmarks.fake_telegram import FakeTelegram
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "123456:loadtest"
+BUSY_PREFIX = "⏳"
+ERROR_PREFIX = "Bot bị lỗi"
+FALLBACK_LINES = ["alo", "ê mày ơi hn đi đâu vl", "viết code python cho tao", "k bít thật à clgt", "kể chuyện cười đi"]
+
+
+def seed_lines():
+    """
+    User lines from data/logs.json ({user_id: ["User: ...", "Bot: ..."]}), the traffic's vocabulary.
+    """
+    try:
+        with open(os.path.join(ROOT, "data", "logs.json"), encoding="utf-8") as f:
+            logs = json.load(f)
+    except (OSError, ValueError):
+        logs = {}
+    lines = [line.partition(": ")[2] for turns in logs.values() for line in turns if line.startswith("User: ")]
+    return [line for line in lines if line.strip()] or FALLBACK_LINES
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Traffic:
+    """
+    Sends messages through FakeTelegram and matches the bot's replies to them.
+
+    Replies quote the message they answer in groups (reply_parameters); a
+    reply also answers older messages of the same user in that chat, which
+    the bot coalesced into one request. Private replies answer the chat.
+    """
+
+    def __init__(self, telegram, lines, seed=0, mention_rate=1.0):
+        self.telegram = telegram
+        self.mention_rate = mention_rate
+        self.lines = lines
+        self.rng = random.Random(seed)
+        self.outstanding = {}  # message_id -> (chat_id, user_id, sent_at)
+        self.unaddressed = set()  # group message_ids the bot may rightly ignore
+        self.waiters = {}  # chat_id -> Future resolved by the next reply (private chats)
+        self.latencies = []
+        self.sent = 0
+        self.answered = 0
+        self.busy = 0
+        self.errors = 0
+        self.chunks = 0
+        self.stopping = False
+
+    def on_send(self, method, params, at):
+        if method != "sendMessage":
+            return
+        text = params.get("text", "")
+        chat_id = params["chat_id"]
+        quoted = (params.get("reply_parameters") or {}).get("message_id")
+        matched = self._match(chat_id, quoted)
+        if not matched:
+            self.chunks += 1  # later parts of a split reply
+            return
+        for message_id, (_, _, sent_at) in matched:
+            del self.outstanding[message_id]
+            if text.startswith(BUSY_PREFIX):
+                self.busy += 1
+            elif text.startswith(ERROR_PREFIX):
+                self.errors += 1
+            else:
+                self.answered += 1
+                self.latencies.append(at - sent_at)
+        waiter = self.waiters.pop(chat_id, None)
+        if waiter and not waiter.done():
+            waiter.set_result(None)
+
+    def _match(self, chat_id, quoted):
+        if quoted in self.outstanding:
+            _, user_id, sent_at = self.outstanding[quoted]
+            # Ignored messages were never coalesced into the quoted one
+            return [(mid, o) for mid, o in self.outstanding.items()
+                    if o[0] == chat_id and o[1] == user_id and o[2] <= sent_at
+                    and (mid == quoted or mid not in self.unaddressed)]
+        return [(mid, o) for mid, o in self.outstanding.items() if o[0] == chat_id]
+
+    def send(self, chat_id, user_id, text, addressed=True):
+        message_id = self.telegram.push_message(chat_id, user_id, text)
+        self.outstanding[message_id] = (chat_id, user_id, time.monotonic())
+        if not addressed:
+            self.unaddressed.add(message_id)
+        self.sent += 1
+
+    def unanswered(self):
+        return sum(1 for message_id in self.outstanding if message_id not in self.unaddressed)
+
+    def ignored(self):
+        return sum(1 for message_id in self.outstanding if message_id in self.unaddressed)
+
+    def conversation(self, length):
+        start = self.rng.randrange(len(self.lines))
+        return [self.lines[(start + i) % len(self.lines)] for i in range(length)]
+
+    async def private_user(self, user_id, think, timeout):
+        rng = random.Random(user_id)
+        for text in itertools.cycle(self.conversation(rng.randint(3, 12))):
+            if self.stopping:
+                return
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters[user_id] = waiter
+            self.send(user_id, user_id, text)
+            try:
+                await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+    async def group_member(self, chat_id, user_id, think):
+        rng = random.Random(user_id)
+        for text in itertools.cycle(self.conversation(rng.randint(3, 12))):
+            await asyncio.sleep(rng.expovariate(1 / think))
+            if self.stopping:
+                return
+            if rng.random() < self.mention_rate:
+                self.send(chat_id, user_id, f"@{self.telegram.me['username']} {text}")
+            else:
+                self.send(chat_id, user_id, text, addressed=False)
+
+
+class BotProcess:
+    def __init__(self, sandbox, env):
+        self.sandbox = sandbox
+        self.env = env
+        self.log_path = os.path.join(sandbox, "bot.log")
+        self.process = None
+
+    def start(self):
+        self._log = open(self.log_path, "w")
+        self.process = subprocess.Popen([sys.executable, os.path.join(ROOT, "main.py")], cwd=self.sandbox,
+                                        env=self.env, stdout=self._log, stderr=subprocess.STDOUT)
+
+    def memory(self):
+        """
+        RSS in MB of the bot and its worker processes.
+        """
+        try:
+            proc = psutil.Process(self.process.pid)
+            procs = [proc] + proc.children(recursive=True)
+            return sum(p.memory_info().rss for p in procs) / 2**20
+        except psutil.Error:
+            return None
+
+    def get(self, path):
+        url = f"http://127.0.0.1:{self.env['PORT']}{path}"
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+        except OSError:
+            return None, ""
+
+    def stop(self, timeout=30):
+        if self.process.poll() is None:
+            self.process.send_signal(signal.SIGINT)
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self._log.close()
+
+    def tail(self, lines=30):
+        with open(self.log_path, encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+
+
+def prepare_sandbox(keys, rate_limits):
+    sandbox = tempfile.mkdtemp(prefix="loadtest_")
+    shutil.copytree(os.path.join(ROOT, "data", "profiles"), os.path.join(sandbox, "data", "profiles"))
+    shutil.copy(os.path.join(ROOT, "data", "viettat.json"), os.path.join(sandbox, "data", "viettat.json"))
+    with open(os.path.join(sandbox, "api_keys.json"), "w") as f:
+        json.dump({"cerebras_api_keys": keys, "rate_limits": rate_limits}, f)
+    return sandbox
+
+
+def key_metrics(text):
+    """
+    Per-key request, error and rotation counters from the bot's /metrics.
+    """
+    keys = {}
+    wanted = {"bot_api_key_requests": "requests", "bot_api_key_errors": "errors",
+              "bot_api_key_rotations": "rotations"}
+    for family in text_string_to_metric_families(text):
+        name = wanted.get(family.name)
+        if not name:
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_total"):
+                row = keys.setdefault(sample.labels["key"], {})
+                label = name if name != "errors" else f"errors_{sample.labels['status']}"
+                row[label] = row.get(label, 0) + int(sample.value)
+    return keys
+
+
+async def run(args):
+    keys = [f"fake-key-{i}" for i in range(args.keys)]
+    lines = seed_lines()
+    telegram = FakeTelegram(flood_control=args.flood_control)
+    traffic = Traffic(telegram, lines, seed=args.seed, mention_rate=args.mention_rate)
+    telegram.on_send = traffic.on_send
+    model_latency = {}
+    for item in args.model_latency:
+        name, _, value = item.partition("=")
+        model_latency[name] = float(value)
+    llm = FakeCerebras(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                       reply_chars=args.reply_chars, error_rate=args.error_rate, bad_keys=keys[:args.bad_keys],
+                       requests_per_minute=args.key_rpm, slow_rate=args.slow_rate,
+                       slow_latency=args.slow_latency,
+                       model_latency=model_latency, seed=args.seed)
+    telegram_port = await telegram.start()
+    llm_port = await llm.start()
+
+    rate_limits = {}
+    if args.bot_rpm:
+        rate_limits["requests_per_minute"] = args.bot_rpm
+    if args.bot_tpm:
+        rate_limits["tokens_per_minute"] = args.bot_tpm
+    sandbox = prepare_sandbox(keys, rate_limits)
+    env = dict(
+        os.environ,
+        TELEGRAM_TOKEN=TOKEN,
+        TELEGRAM_API_URL=f"http://127.0.0.1:{telegram_port}",
+        CEREBRAS_BASE_URL=f"http://127.0.0.1:{llm_port}",
+        PORT=str(free_port()),
+        PYTHONPATH=ROOT,
+        STREAM_REPLIES="0",
+    )
+    for item in args.env:
+        name, _, value = item.partition("=")
+        env[name] = value
+    bot = BotProcess(sandbox, env)
+    bot.start()
+    report = {}
+    try:
+        # Ready = polling Telegram and /health green (AI warmed up)
+        deadline = time.monotonic() + args.startup_timeout
+        while time.monotonic() < deadline:
+            if bot.process.poll() is not None:
+                raise RuntimeError(f"bot exited during startup:\n{bot.tail()}")
+            if telegram.polling.is_set() and bot.get("/health")[0] == 200:
+                break
+            await asyncio.sleep(0.2)
+        else:
+            raise RuntimeError(f"bot not ready after {args.startup_timeout}s:\n{bot.tail()}")
+        print(f"Bot ready, {args.users} private users + {args.groups} groups x {args.group_size} for {args.duration}s")
+
+        rss_start = bot.memory()
+        peak = rss_start
+        tasks = []
+        users = list(range(1, args.users + 1))
+        for user_id in users:
+            tasks.append(asyncio.create_task(traffic.private_user(user_id, args.think, args.reply_timeout)))
+        next_user = args.users + 1
+        for g in range(1, args.groups + 1):
+            for _ in range(args.group_size):
+                tasks.append(asyncio.create_task(traffic.group_member(-g, next_user, args.think * args.group_size)))
+                next_user += 1
+
+        started = time.monotonic()
+        while time.monotonic() - started < args.duration:
+            await asyncio.sleep(1)
+            rss = bot.memory()
+            if rss:
+                peak = max(peak or 0, rss)
+            if args.progress:
+                print(f"  t={time.monotonic() - started:5.0f}s sent={traffic.sent} answered={traffic.answered} "
+                      f"busy={traffic.busy} pending={traffic.unanswered()} rss={rss or 0:.0f}MB")
+        traffic.stopping = True
+        answered_in_window = traffic.answered
+        # Let in-flight messages finish
+        drain_until = time.monotonic() + args.drain
+        while traffic.unanswered() and time.monotonic() < drain_until:
+            await asyncio.sleep(0.5)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        status, metrics_text = bot.get("/metrics")
+        lat = traffic.latencies
+        report = {
+            "config": {k: v for k, v in vars(args).items() if k not in ("json", "progress")},
+            "sent": traffic.sent,
+            "answered": traffic.answered,
+            "busy": traffic.busy,
+            "errors": traffic.errors,
+            "unanswered": traffic.unanswered(),
+            "ignored": traffic.ignored(),
+            "extra_chunks": traffic.chunks,
+            "throughput_per_s": answered_in_window / args.duration,
+            "latency_s": {
+                "p50": percentile(lat, 0.5), "p95": percentile(lat, 0.95),
+                "p99": percentile(lat, 0.99), "max": max(lat) if lat else None,
+            },
+            "llm_keys": {key: dict(counter) for key, counter in llm.stats.items()},
+            "llm_models": dict(llm.models),
+            "bot_keys": key_metrics(metrics_text) if status == 200 else {},
+            "memory_mb": {"start": rss_start, "peak": peak, "end": bot.memory()},
+            "telegram_calls": dict(telegram.calls),
+            "telegram_429": dict(telegram.flooded),
+        }
+    finally:
+        bot.stop()
+        await telegram.close()
+        await llm.close()
+        if args.keep_sandbox:
+            print(f"Sandbox kept at {sandbox}")
+        else:
+            shutil.rmtree(sandbox, ignore_errors=True)
+    return report
+
+
+def print_report(report):
+    lat = report["latency_s"]
+    fmt = lambda v: f"{v:.2f}s" if v is not None else "-"
+    print(f"\nsent {report['sent']}  answered {report['answered']}  busy {report['busy']}  "
+          f"errors {report['errors']}  unanswered {report['unanswered']}  ignored {report['ignored']}")
+    print(f"throughput {report['throughput_per_s']:.1f} replies/s")
+    print(f"latency p50 {fmt(lat['p50'])}  p95 {fmt(lat['p95'])}  p99 {fmt(lat['p99'])}  max {fmt(lat['max'])}")
+    mem = report["memory_mb"]
+    if mem["start"]:
+        print(f"memory start {mem['start']:.0f}MB  peak {mem['peak']:.0f}MB  end {(mem['end'] or 0):.0f}MB")
+    if report["telegram_429"]:
+        print("telegram 429 " + "  ".join(f"{m} {n}" for m, n in sorted(report["telegram_429"].items())))
+    print(f"\n{'key':<14} {'llm req':>8} {'ok':>6} {'429':>6} {'401':>6}   {'bot req':>8} {'rotations':>9}")
+    bot_keys = report["bot_keys"]
+    for i, (key, stats) in enumerate(sorted(report["llm_keys"].items())):
+        # The bot labels keys by index in api_keys.json
+        index = key.rsplit("-", 1)[-1]
+        bot = bot_keys.get(index, {})
+        print(f"{key:<14} {stats.get('requests', 0):>8} {stats.get('ok', 0):>6} {stats.get('429', 0):>6} "
+              f"{stats.get('401', 0):>6}   {bot.get('requests', 0):>8} {bot.get('rotations', 0):>9}")
+    print("\nmodels " + "  ".join(f"{model} {count}" for model, count in sorted(report["llm_models"].items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="private-chat users (closed loop)")
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--group-size", type=int, default=20, help="members chatting in each group")
+    parser.add_argument("--mention-rate", type=float, default=0.2, help="share of group messages that @mention the bot")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of traffic")
+    parser.add_argument("--think", type=float, default=5.0, help="mean seconds a user waits between messages")
+    parser.add_argument("--reply-timeout", type=float, default=60, help="private users give up waiting after this")
+    parser.add_argument("--drain", type=float, default=30, help="seconds to wait for replies after traffic stops")
+    parser.add_argument("--keys", type=int, default=4, help="fake API keys")
+    parser.add_argument("--bad-keys", type=int, default=0, help="how many of them always answer 401")
+    parser.add_argument("--key-rpm", type=int, default=None, help="fake server's per-key requests/minute (429 above)")
+    parser.add_argument("--bot-rpm", type=int, help="per-key requests/minute the bot budgets (api_keys.json rate_limits)")
+    parser.add_argument("--bot-tpm", type=int, help="per-key tokens/minute the bot budgets")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of LLM calls answered with 429")
+    parser.add_argument("--latency", type=float, default=0.8, help="mean LLM latency before the first token")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of LLM calls that stall")
+    parser.add_argument("--slow-latency", type=float, default=10.0, help="latency of a stalled LLM call")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="mean latency of one model instead of --latency")
+    parser.add_argument("--tokens-per-second", type=float, default=300)
+    parser.add_argument("--reply-chars", type=int, default=400)
+    parser.add_argument("--flood-control", action="store_true",
+                        help="fake Telegram answers 429 over its usual per-chat and global limits")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra bot environment")
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--progress", action="store_true", help="print a status line every second")
+    parser.add_argument("--keep-sandbox", action="store_true", help="keep the bot's scratch dir and log")
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        report["python"] = platform.python_version()
+        report["platform"] = platform.platform()
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,188 @@
 import re
 import json
 import os
+import asyncio
+import inspect
 from pathlib import Path
-from cerebras.cloud.sdk import Cerebras
 from telegram import Update
 from telegram.ext import ContextTypes
-from utils.logger import log
-from utils.storage import db
+from utils.logger import log, sample_chat, clip
+from utils.storage import db, conversations
+from utils.normalizer import AbbreviationNormalizer
+from utils.cache import ConversationCache
+from utils.profiles import ProfileRegistry
+from utils.streaming import StreamingReply
+from utils.coalescer import MessageCoalescer
+from utils.scheduler import ChatScheduler, Busy
+from utils.response_cache import ResponseCache
+from utils.history import HistoryBuilder
+from utils.splitter import MAX_MESSAGE_LENGTH, split_message, send_chunks
+from utils.key_pool import KeyPool, status_code, retry_after
+from utils.request_policy import (
+    RequestPolicy, DeadlineExceeded, classify, AUTH, RATE_LIMIT, TIMEOUT, SERVER, RETRYABLE,
+)
+from utils.model_router import ModelRouter
+from utils.engagement import EngagementPolicy, MODES
+from utils.metrics import (
+    stage, record_usage, CHATS_IN_FLIGHT, KEY_REQUESTS, KEY_ERRORS, KEY_ROTATIONS, LLM_HEDGES,
+)
 
 PROFILES_DIR = Path("data/profiles")
 
+class LLMBackend:
+    """
+    Async completion client with one long-lived connection pool per API key.
+    Concurrency is capped by a semaphore instead of the executor's thread count;
+    callers hold a slot (acquire/release) around complete(), so time spent
+    queued for one isn't part of the call's own timeout.
+    """
+
+    def __init__(self, model_name, max_concurrency=16, max_connections=32):
+        self.model_name = model_name
+        self.max_connections = max_connections
+        self._clients = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def client(self, api_key):
+        client = self._clients.get(api_key)
+        if client is None:
+            # The SDK is slow to import; load it on first use instead of at startup
+            import httpx
+            from cerebras.cloud.sdk import AsyncCerebras, DefaultAsyncHttpxClient
+
+            client = AsyncCerebras(
+                api_key=api_key,
+                # Retries go through ChatbotHandler._complete, which moves them to another key
+                max_retries=0,
+                # The SDK's warm-up is a blocking sync request on a throwaway client
+                warm_tcp_connection=False,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    )
+                ),
+            )
+            self._clients[api_key] = client
+        return client
+
+    async def acquire(self, timeout=None):
+        await asyncio.wait_for(self._semaphore.acquire(), timeout)
+
+    def release(self):
+        self._semaphore.release()
+
+    async def complete(self, messages, api_key, model=None, **params):
+        return await self.client(api_key).chat.completions.create(
+            model=model or self.model_name,
+            messages=messages,
+            **params
+        )
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                await client.close()
+            except Exception as e:
+                log.warning(f"Failed to close LLM client: {e}")
+
+
 class ChatbotHandler:
-    def __init__(self):
+    def __init__(self, ledger=None):
+        self.ledger = ledger  # KeyLedger shared with sibling worker processes
+        # Set in worker mode: called with (kind, value) so siblings apply admin changes too
+        self.broadcast = None
+        self.key_limits = {}
+        self.keys = []
+        self.key_pool = KeyPool([])
+        self.router = ModelRouter.from_env("qwen-3-32b")
+        # Default large model; profiles and the router can pick others per message
+        self.model_name = self.router.large
+        self.llm = LLMBackend(
+            self.model_name,
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+        )
+        self.request_policy = RequestPolicy.from_env()
+        self.abbreviations = {}
+        self.current_profile = "default"
+        self.profiles = ProfileRegistry(PROFILES_DIR)
+        # The window only bounds memory; HistoryBuilder trims by token budget
+        self.history = ConversationCache(conversations, window=40)
+        budget = os.getenv("HISTORY_TOKEN_BUDGET")
+        self.history_builder = HistoryBuilder(
+            summarize=self.summarize_history if os.getenv("HISTORY_SUMMARY", "0") == "1" else None,
+            budgets={self.model_name: int(budget)} if budget else None,
+            max_turns=self.history.window,
+        )
+        self.scheduler = ChatScheduler(
+            max_concurrent=int(os.getenv("MAX_CONCURRENT_CHATS", "8")),
+            max_queue=int(os.getenv("MAX_QUEUED_CHATS", "100")),
+            max_chat_queue=int(os.getenv("MAX_QUEUED_PER_CHAT", "10")),
+        )
+        self.coalescer = MessageCoalescer(
+            self._schedule_chat,
+            window=float(os.getenv("COALESCE_WINDOW", "0.7")),
+        )
+        self.engagement = EngagementPolicy.from_env()
+        self.response_cache = None
+        if os.getenv("RESPONSE_CACHE", "0") == "1":
+            self.response_cache = ResponseCache(use_history=os.getenv("RESPONSE_CACHE_HISTORY", "0") == "1")
+        # Keys, dictionary and history migration load in warm_up(), off the startup path
+        self._warm_up = None
+        self.warmed = False
+        self.ready_timeout = float(os.getenv("READY_TIMEOUT", "30"))
+
+    def warm_up(self):
+        """
+        Blocking part of startup. start() runs it in a thread so updates are
+        received right away; call it directly when not using start().
+        """
         self.keys = self.load_keys()
-        self.current_key_index = 0
-        self.client = None
-        self.model_name = "qwen-3-32b"
         self.abbreviations = self.load_abbreviations()
-        self.current_profile = "default"
+        self.engagement.modes.update(conversations.chat_settings("group_mode"))
+        conversations.migrate_from_json(db, "logs")
+        if self.response_cache and os.getenv("RESPONSE_CACHE_PERSIST", "0") == "1":
+            self.response_cache.load(conversations)
         self.setup_ai()
+        self.warmed = True
+
+    async def start(self):
+        """
+        Starts background work once the event loop is running.
+        """
+        self.history.start()
+        if not self.warmed:
+            self._warm_up = asyncio.create_task(asyncio.to_thread(self.warm_up))
+            self._warm_up.add_done_callback(self._report_warm_up)
+
+    @staticmethod
+    def _report_warm_up(task):
+        if not task.cancelled() and task.exception():
+            log.error(f"AI Module failed to start: {task.exception()}")
+
+    async def wait_ready(self):
+        """
+        Waits for warm_up() so messages that arrive first are answered, not dropped.
+        True once the AI can be used.
+        """
+        task = self._warm_up
+        if task is not None and not task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(task), self.ready_timeout)
+            except asyncio.TimeoutError:
+                log.warning(f"AI Module still starting after {self.ready_timeout:.0f}s")
+            except Exception:
+                pass  # Reported by _report_warm_up
+        return bool(self.key_pool)
+
+    async def shutdown(self):
+        await self.coalescer.close()
+        await self.history_builder.close()
+        await self.history.close()
+        if self.response_cache and os.getenv("RESPONSE_CACHE_PERSIST", "0") == "1":
+            await asyncio.to_thread(self.response_cache.save, conversations)
+        await self.llm.close()
 
     def load_keys(self):
         keys = []
@@ -26,6 +190,8 @@ class ChatbotHandler:
             with open("api_keys.json", "r") as f:
                 data = json.load(f)
                 keys = data.get("cerebras_api_keys", [])
+                # Optional per-key budgets: {"requests_per_minute": 30, "tokens_per_minute": 60000}
+                self.key_limits = data.get("rate_limits", {})
         except FileNotFoundError:
             log.error("api_keys.json not found!")
         
@@ -33,134 +199,296 @@ class ChatbotHandler:
             log.warning("No keys found in api_keys.json!")
         return keys
 
-    def rotate_key(self):
-        if not self.keys:
-            return False
-        self.current_key_index = (self.current_key_index + 1) % len(self.keys)
-        self.setup_ai()
-        log.info(f"Switched to API Key index: {self.current_key_index}")
-        return True
-
     def load_abbreviations(self):
         return db.load("viettat", default={})
 
+    @property
+    def abbreviations(self):
+        return self.normalizer.abbreviations
+
+    @abbreviations.setter
+    def abbreviations(self, value):
+        # Rebuild the compiled matcher whenever the dictionary is replaced
+        self.normalizer = AbbreviationNormalizer(value)
+
     def normalize_input(self, text):
-        if not text:
-            return ""
-        for abbr, full in self.abbreviations.items():
-            pattern = re.compile(r'\b' + re.escape(abbr) + r'\b', re.IGNORECASE)
-            text = pattern.sub(full, text)
-        return text
+        return self.normalizer.normalize(text)
 
     def setup_ai(self):
         if not self.keys:
             log.warning("No API Keys available! AI Module is offline.")
             return
-        current_key = self.keys[self.current_key_index]
-        try:
-            self.client = Cerebras(api_key=current_key)
-        except Exception as e:
-            log.error(f"Failed to initialize Cerebras SDK: {e}")
+        self.key_pool = KeyPool(self.keys, ledger=self.ledger, **self.key_limits)
+        log.info(f"AI Module ready with {len(self.keys)} API key(s)")
+
+    def apply_control(self, kind, value=None):
+        """
+        Applies an admin change made in a sibling worker process.
+        """
+        if kind == "profile":
+            self.current_profile = value
+        elif kind == "reload":
+            self.profiles.reload()
+            self.abbreviations = self.load_abbreviations()
+
+    def _broadcast(self, kind, value=None):
+        if self.broadcast:
+            self.broadcast(kind, value)
 
     def get_available_profiles(self):
-        profiles = []
-        if PROFILES_DIR.exists():
-            for file in PROFILES_DIR.glob("*.json"):
-                try:
-                    with open(file, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                        profiles.append({
-                            "id": file.stem,
-                            "name": data.get("name", file.stem),
-                            "description": data.get("description", "Không có mô tả")
-                        })
-                except:
-                    pass
-        return profiles
+        return self.profiles.list()
 
     def load_profile(self, profile_name: str):
-        profile_path = PROFILES_DIR / f"{profile_name}.json"
-        if profile_path.exists():
-            try:
-                with open(profile_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except:
-                pass
-        return None
+        return self.profiles.get(profile_name)
 
     def get_system_prompt(self):
-        profile = self.load_profile(self.current_profile)
-        if not profile:
-            profile = self.load_profile("default")
-        if not profile:
-            return "Bạn là một trợ lý ảo thân thiện."
-        
-        rules = "\n".join([f"- {r}" for r in profile.get("rules", [])])
-        
-        return (
-            f"{profile.get('context', '')}\n\n"
-            f"Tên: {profile.get('name', 'Chatbot')}\n"
-            f"Tính cách: {profile.get('personality', 'Friendly')}\n\n"
-            f"Quy tắc:\n{rules}\n\n"
-            f"Phong cách: {profile.get('language_style', 'Natural')}\n"
-        )
+        return self.profiles.prompt(self.current_profile)
 
-    def clean_response(self, text):
-        # Remove <think> tags
-        cleaned = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
-        
+    def strip_markdown(self, text):
         # Remove all markdown formatting for clean text display
-        cleaned = re.sub(r'\*\*', '', cleaned)  # Remove bold **
+        cleaned = re.sub(r'\*\*', '', text)  # Remove bold **
         cleaned = re.sub(r'\*', '', cleaned)    # Remove italic *
         cleaned = re.sub(r'__', '', cleaned)    # Remove underline __
         cleaned = re.sub(r'_', '', cleaned)     # Remove italic _
         cleaned = re.sub(r'~~', '', cleaned)    # Remove strikethrough ~~
         cleaned = re.sub(r'`', '', cleaned)     # Remove code `
+        return cleaned
+
+    def clean_response(self, text):
+        # Remove <think> tags
+        cleaned = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
+        
+        cleaned = self.strip_markdown(cleaned)
         
         if not cleaned:
             return "..."
         return cleaned.strip()
 
-    async def generate_reply(self, user_input, history=""):
-        full_prompt = f"Chat History:\n{history}\n\nUser: {user_input}"
-        max_retries = len(self.keys) if self.keys else 1
-        attempts = 0
+    def use_streaming(self):
+        """
+        Streaming is on when the active profile says so, else when STREAM_REPLIES=1.
+        """
+        profile = self.load_profile(self.current_profile) or {}
+        if "streaming" in profile:
+            return bool(profile["streaming"])
+        return os.getenv("STREAM_REPLIES", "0") == "1"
+
+    def route(self, user_input):
+        return self.router.route(user_input, self.load_profile(self.current_profile))
+
+    async def generate_reply(self, user_input, history=None, stream=False, deadline=None, route=None):
+        # System prompt first and history in stored order keep the prefix
+        # stable between turns, which lets provider-side prompt caching hit
+        messages = [{"role": "system", "content": self.get_system_prompt()}]
+        messages.extend(history or [])
+        messages.append({"role": "user", "content": user_input})
+        route = route or self.route(user_input)
+        return await self._complete(
+            messages,
+            temperature=route["temperature"],
+            max_tokens=route["max_tokens"],
+            stream=stream,
+            deadline=deadline,
+            models=route["models"],
+            reasoning=route["reasoning"]
+        )
+
+    async def summarize_history(self, previous_summary, turns):
+        """Fold turns that no longer fit the history budget into a short summary"""
+        transcript = "\n".join(
+            f"{'Bot' if role == 'assistant' else 'User'}: {content}" for role, content in turns
+        )
+        prompt = (
+            "Tóm tắt ngắn gọn (tối đa 5 câu) nội dung chính của cuộc trò chuyện sau, "
+            "giữ lại thông tin về người dùng.\n\n"
+            f"Tóm tắt trước đó:\n{previous_summary or '(không có)'}\n\n"
+            f"Hội thoại:\n{transcript}"
+        )
+        response = await self._complete(
+            [{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=200,
+            reasoning=False
+        )
+        return self.clean_response(response.choices[0].message.content)
 
-        while attempts < max_retries:
+    async def _complete(self, messages, max_tokens, stream=False, deadline=None, models=None,
+                        reasoning=True, **params):
+        """
+        Completion with retries on other keys until `deadline` (event loop time,
+        defaults to LLM_DEADLINE from now). Timeouts, 5xx and unknown-model
+        errors move on to the next model of `models`. Non-stream calls may be hedged.
+        """
+        # Rough budget: ~3 chars per token for Vietnamese plus the completion cap
+        estimated_tokens = sum(len(m["content"]) for m in messages) // 3 + max_tokens
+        policy = self.request_policy
+        if deadline is None:
+            deadline = policy.deadline_from_now()
+        models = models or self.router.chain([self.model_name, *self.router.fallbacks])
+        index = 0
+        tried = set()
+
+        # Ends when a call succeeds, the deadline passes or no untried key is left
+        while True:
+            model = models[index]
             try:
-                if not self.client:
-                    self.setup_ai()
-                    if not self.client:
-                        raise Exception("No client available")
-
-                # Cerebras mostly sync, run in executor
-                # (Simple wrapper since cerebras sdk might block)
-                import asyncio
-                loop = asyncio.get_running_loop()
-                
-                response = await loop.run_in_executor(
-                    None,
-                    lambda: self.client.chat.completions.create(
-                        model=self.model_name,
-                        messages=[
-                            {"role": "system", "content": self.get_system_prompt()},
-                            {"role": "user", "content": full_prompt}
-                        ],
-                        temperature=0.9, 
-                        max_tokens=800 # Telegram allows longer messages
-                    )
+                key = await asyncio.wait_for(
+                    self.key_pool.acquire(estimated_tokens, exclude=tried), policy.remaining(deadline)
                 )
-                return response
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded() from None
+            tried.add(key.key)
+            call = (
+                self.router.messages_for(model, messages, reasoning), model, max_tokens,
+                estimated_tokens, deadline, stream, params,
+            )
+            try:
+                if stream:
+                    return await self._attempt(key, *call)
+                return await self._hedged(key, *call)
+            except DeadlineExceeded:
+                raise
             except Exception as e:
-                error_msg = str(e)
-                if "401" in error_msg or "429" in error_msg:
-                    log.warning(f"Key failed ({error_msg}). Rotating...")
-                    if self.rotate_key():
-                        attempts += 1
-                        continue
-                raise e
-        
-        raise Exception("All API Keys exhausted.")
+                kind = classify(e)
+                if index + 1 < len(models) and (kind in (TIMEOUT, SERVER) or status_code(e) == 404):
+                    index += 1
+                    tried.clear()
+                    log.warning(f"Model {model} failed ({kind}), falling back to {models[index]}")
+                    continue
+                if kind not in RETRYABLE:
+                    raise e
+
+    async def _attempt(self, key, messages, model, max_tokens, estimated_tokens, deadline, stream, params):
+        """
+        One call on an acquired key, bounded by LLM_ATTEMPT_TIMEOUT and the
+        deadline. Always gives the key back, or hands it to the stream.
+        """
+        loop = asyncio.get_running_loop()
+        used_tokens = None
+        handed_off = False
+        KEY_REQUESTS.labels(str(key.index)).inc()
+        try:
+            # Queueing for a local call slot is bounded by the deadline only; it
+            # says nothing about the model or key, so it isn't an attempt timeout
+            try:
+                await self.llm.acquire(self.request_policy.remaining(deadline))
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded() from None
+            try:
+                started = loop.time()
+                response = await asyncio.wait_for(
+                    self.llm.complete(
+                        messages,
+                        api_key=key.key,
+                        model=model,
+                        max_tokens=max_tokens,
+                        stream=stream,
+                        **params
+                    ),
+                    self.request_policy.attempt_budget(deadline),
+                )
+            finally:
+                self.llm.release()
+            elapsed = loop.time() - started
+            self.router.observe(model, elapsed)
+            if stream:
+                # The key stays reserved until the stream is consumed or closed
+                handed_off = True
+                chunks = self._release_after_stream(response, key, model, estimated_tokens, deadline)
+                # Started, so aclose() reaches its finally even if nothing is ever read
+                await anext(chunks)
+                return chunks
+            self.request_policy.observe(model, elapsed)
+            usage = getattr(response, "usage", None)
+            used_tokens = getattr(usage, "total_tokens", None)
+            record_usage(usage, model)
+            return response
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            kind = classify(e)
+            self.router.observe(model, error_kind=kind)
+            KEY_ERRORS.labels(str(key.index), str(status_code(e) or kind)).inc()
+            if kind == AUTH:
+                self.key_pool.disable(key)
+            elif kind == RATE_LIMIT:
+                self.key_pool.cooldown(key, retry_after(e))
+            if kind in RETRYABLE:
+                KEY_ROTATIONS.labels(str(key.index)).inc()
+            raise e
+        finally:
+            if not handed_off:
+                self.key_pool.release(key, estimated_tokens, used_tokens)
+
+    async def _hedged(self, key, *call):
+        """
+        Runs the attempt on `key`; if it is still going after the hedge delay
+        (p95 of recent attempts), starts a duplicate on a second key that has
+        budget right now. The first success wins and the other is cancelled.
+        """
+        policy = self.request_policy
+        delay = policy.hedge_delay(call[1])
+        primary = asyncio.ensure_future(self._attempt(key, *call))
+        tasks = {primary}
+        winner = primary
+        try:
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            backup_key = None if done else self.key_pool.try_acquire(call[3], exclude={key.key})
+            if backup_key is None:
+                return await primary
+
+            policy.hedges += 1
+            backup = asyncio.ensure_future(self._attempt(backup_key, *call))
+            tasks.add(backup)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        LLM_HEDGES.labels("backup" if task is backup else "primary").inc()
+                        winner = task
+                        return task.result()
+            LLM_HEDGES.labels("none").inc()
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and not task.cancelled() and task.exception() is None:
+                    # Both finished at once; a losing stream still holds its key
+                    result = task.result()
+                    if inspect.isasyncgen(result):
+                        await result.aclose()
+
+    async def _release_after_stream(self, stream, key, model, estimated_tokens, deadline):
+        used_tokens = None
+        chunks = aiter(stream)
+        try:
+            yield None  # consumed by _attempt, which starts the generator
+            while True:
+                # A stalled stream times out like a slow call, measured per chunk
+                try:
+                    chunk = await asyncio.wait_for(
+                        anext(chunks), self.request_policy.attempt_budget(deadline)
+                    )
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    KEY_ERRORS.labels(str(key.index), "timeout").inc()
+                    raise
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    used_tokens = getattr(usage, "total_tokens", None)
+                    record_usage(usage, model)
+                yield chunk
+        finally:
+            try:
+                # Gives the pooled connection back, also when the consumer stopped early
+                await stream.close()
+            finally:
+                self.key_pool.release(key, estimated_tokens, used_tokens)
 
     async def list_profiles(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         profiles = self.get_available_profiles()
@@ -211,6 +539,7 @@ class ChatbotHandler:
             return
         
         self.current_profile = profile_name
+        self._broadcast("profile", profile_name)
         text = (
             f"✅ **Đã đổi Profile!**\n"
             f"Đã chuyển sang: **{profile.get('name', profile_name)}**\n"
@@ -218,8 +547,49 @@ class ChatbotHandler:
         )
         await update.message.reply_text(text, parse_mode="Markdown")
 
+    async def reload(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        ADMIN_ID = 7509896689
+        user_id = update.effective_user.id
+
+        if user_id != ADMIN_ID:
+            await update.message.reply_text("❌ Chỉ admin mới được dùng lệnh này!")
+            return
+
+        profiles = self.profiles.reload()
+        self.abbreviations = self.load_abbreviations()
+        self._broadcast("reload")
+        await update.message.reply_text(
+            f"🔄 Đã tải lại {len(profiles)} profile và {len(self.abbreviations)} từ viết tắt."
+        )
+
+    async def group_mode(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        ADMIN_ID = 7509896689
+        chat_id = update.effective_chat.id
+
+        if not context.args:
+            await update.message.reply_text(
+                f"💬 Chế độ trả lời trong nhóm này: `{self.engagement.mode(chat_id)}`\n"
+                f"Có sẵn: {', '.join(MODES)}",
+                parse_mode="Markdown"
+            )
+            return
+
+        if update.effective_user.id != ADMIN_ID:
+            await update.message.reply_text("❌ Chỉ admin mới được dùng lệnh này!")
+            return
+
+        mode = context.args[0].lower()
+        if mode not in MODES:
+            await update.message.reply_text(f"❌ Chế độ `{mode}` không tồn tại!\nCó sẵn: {', '.join(MODES)}")
+            return
+
+        # Only this chat's worker sees its messages, so nothing to broadcast
+        self.engagement.set_mode(chat_id, mode)
+        await asyncio.to_thread(conversations.set_chat_setting, chat_id, "group_mode", mode)
+        await update.message.reply_text(f"✅ Đã đổi chế độ trả lời trong nhóm sang `{mode}`", parse_mode="Markdown")
+
     async def chat_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if not self.client:
+        if not await self.wait_ready():
             await update.message.reply_text("Bot chưa sẵn sàng 😢")
             return
         
@@ -228,92 +598,135 @@ class ChatbotHandler:
             await update.message.reply_text("Hãy nhập nội dung chat! Ví dụ: `/chat Xin chào`")
             return
 
-        await self._process_chat(update, user_input)
+        await self._process_chat(update, self.normalize_input(user_input))
 
     async def on_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if not self.client:
-            return # Silent fail if not ready or not intended
+        if not await self.wait_ready():
+            return # Silent fail if no API keys are configured
             
-        user_input = update.message.text
-        # Respond to all messages in groups and private chats
-        # Bot will reply to every text message like a direct conversation
+        with stage("normalize"):
+            normalized_content = self.normalize_input(update.message.text)
+        # Groups only get a reply when the bot is addressed (see GROUP_REPLY_MODE)
+        if not self.engagement.decide(update.message, context.bot, normalized_content):
+            return
         
-        await self._process_chat(update, user_input)
+        # Lines sent in quick succession are answered together
+        key = (update.effective_chat.id, update.effective_user.id)
+        await self.coalescer.submit(key, update, normalized_content)
 
-    async def _process_chat(self, update: Update, raw_content: str):
-        normalized_content = self.normalize_input(raw_content)
+    async def _schedule_chat(self, update: Update, normalized_content: str):
+        # Coalesced batches run after the update's own turn ended, so they queue again
+        try:
+            await self.scheduler.run(update.effective_chat.id, self._process_chat(update, normalized_content))
+        except Busy:
+            await self.scheduler.reply_busy(update.message)
+
+    async def _process_chat(self, update: Update, normalized_content: str):
+        with CHATS_IN_FLIGHT.track_inprogress():
+            await self._handle_chat(update, normalized_content)
+
+    def history_key(self, update: Update):
+        """
+        Key of the history a message belongs to. Workers own chats, not users,
+        so in worker mode a user's group history is kept apart from their
+        private chat (whose id is the user id) and each key lives on one worker.
+        """
         user_id = str(update.effective_user.id)
+        chat_id = str(update.effective_chat.id)
+        if self.ledger is not None and chat_id != user_id:
+            return f"{chat_id}:{user_id}"
+        return user_id
+
+    async def _handle_chat(self, update: Update, normalized_content: str):
+        """`normalized_content` has already been through normalize_input()"""
+        user_id = self.history_key(update)
         
         # Logging
-        current_logs = db.load("logs", default={})
-        if user_id not in current_logs:
-            current_logs[user_id] = []
-        
-        current_logs[user_id].append(f"User: {normalized_content}")
-        if len(current_logs[user_id]) > 20:
-            current_logs[user_id] = current_logs[user_id][-20:]
-        db.save("logs", current_logs)
+        with stage("history_load"):
+            past_turns = self.history.last(user_id)
+        recorded = False
+        deadline = self.request_policy.deadline_from_now()
         
         await update.message.chat.send_action(action="typing")
         
         try:
-            history = "\n".join(current_logs.get(user_id, [])[:-1])
-            response = await self.generate_reply(normalized_content, history)
+            cache_key = None
+            if self.response_cache:
+                cache_key = self.response_cache.key(self.current_profile, normalized_content, past_turns)
+            cached = self.response_cache.get(cache_key) if cache_key else None
+            streamed = False
+            
+            if not cached:
+                # History is sized for the model the message is routed to
+                route = self.route(normalized_content)
+                with stage("history_build"):
+                    history = self.history_builder.build(user_id, past_turns, route["models"][0])
             
-            raw_text = response.choices[0].message.content.strip()
-            reply_text = self.clean_response(raw_text)
+            if cached:
+                reply_text = cached
+            elif self.use_streaming():
+                # Covers generation and the progressive edits together
+                with stage("llm_stream"):
+                    reply_text = await self._stream_reply(update, normalized_content, history, deadline, route)
+                streamed = True
+            else:
+                with stage("llm"):
+                    response = await self.generate_reply(normalized_content, history, deadline=deadline, route=route)
+                
+                with stage("clean"):
+                    raw_text = response.choices[0].message.content.strip()
+                    reply_text = self.clean_response(raw_text)
             
-            current_logs[user_id].append(f"Bot: {reply_text}")
-            db.save("logs", current_logs)
+            if cache_key and not cached:
+                self.response_cache.put(cache_key, reply_text)
             
-            log.info(f"Chat [{self.current_profile}] - User: {normalized_content}")
-            log.info(f"Chat [{self.current_profile}] - Bot: {reply_text[:50]}...")
+            # Past this point newer messages no longer cancel this reply
+            self.coalescer.commit()
+            with stage("history_save"):
+                self.history.append(user_id, "user", normalized_content)
+                self.history.append(user_id, "assistant", reply_text)
+            recorded = True
             
-            # Split message if too long (Telegram limit: 4096 characters)
-            await self._send_split_message(update, reply_text)
+            if sample_chat():
+                log.info(f"Chat [{self.current_profile}] - User: {clip(normalized_content)}")
+                log.info(f"Chat [{self.current_profile}] - Bot: {clip(reply_text, 50)}")
+            
+            if not streamed:
+                # Split message if too long (Telegram limit: 4096 characters)
+                with stage("send"):
+                    await self._send_split_message(update, reply_text)
             
         except Exception as e:
+            self.coalescer.commit()
+            if not recorded:
+                self.history.append(user_id, "user", normalized_content)
             log.error(f"AI Error: {e}")
             await update.message.reply_text(f"Bot bị lỗi: {str(e)[:50]}")
     
-    async def _send_split_message(self, update: Update, text: str, max_length: int = 4000):
-        """Split and send long messages in chunks to avoid Telegram's 4096 char limit"""
-        if len(text) <= max_length:
-            await update.message.reply_text(text)
-            return
+    async def _stream_reply(self, update: Update, user_input: str, history: list, deadline=None, route=None):
+        """Stream the completion into a message that is edited as tokens arrive"""
+        stream = await self.generate_reply(user_input, history, stream=True, deadline=deadline, route=route)
         
-        # Split by paragraphs first to keep context
-        parts = []
-        current_part = ""
-        
-        # Try splitting by double newlines (paragraphs)
-        paragraphs = text.split('\n\n')
-        
-        for para in paragraphs:
-            # If adding this paragraph exceeds limit, save current part
-            if len(current_part) + len(para) + 2 > max_length:
-                if current_part:
-                    parts.append(current_part.strip())
-                    current_part = para
-                else:
-                    # Single paragraph is too long, split by newlines
-                    lines = para.split('\n')
-                    for line in lines:
-                        if len(current_part) + len(line) + 1 > max_length:
-                            if current_part:
-                                parts.append(current_part.strip())
-                            current_part = line
-                        else:
-                            current_part += ("\n" if current_part else "") + line
-            else:
-                current_part += ("\n\n" if current_part else "") + para
-        
-        if current_part:
-            parts.append(current_part.strip())
+        # Groups tolerate far fewer edits per minute than private chats
+        interval = 1.0 if update.effective_chat.type == "private" else 3.0
+        reply = StreamingReply(update.message, clean=self.strip_markdown, edit_interval=interval)
+        self.coalescer.commit()
+        try:
+            await reply.start()
+            
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    await reply.feed(delta)
+        finally:
+            # Releases the key and closes the HTTP stream if sending failed midway
+            await stream.aclose()
         
-        # Send all parts
-        for i, part in enumerate(parts):
-            if i > 0:
-                await update.message.chat.send_action(action="typing")
-            await update.message.reply_text(part)
+        return await reply.finish()
 
+    async def _send_split_message(self, update: Update, text: str, max_length: int = MAX_MESSAGE_LENGTH):
+        """Split and send long messages in chunks to avoid Telegram's 4096 char limit"""
+        # The typing action was already sent; parts go out back to back, in order
+        await send_chunks(update.message, split_message(text, max_length))
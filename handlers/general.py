@@ -1,12 +1,16 @@
 import time
 import platform
-import psutil
 from telegram import Update
 from telegram.ext import ContextTypes
 import telegram
 from utils.logger import log
 
 class GeneralHandler:
+    def __init__(self, monitor=None, scheduler=None, chatbot=None):
+        self.monitor = monitor  # utils.diagnostics.LoopMonitor
+        self.scheduler = scheduler  # utils.scheduler.ChatScheduler
+        self.chatbot = chatbot  # handlers.chatbot.ChatbotHandler, for the admin's key and model status
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🤖 Antigravity Bot Online. Gõ /help để xem danh sách lệnh.")
 
@@ -17,25 +21,31 @@ class GeneralHandler:
             "/start - Khởi động bot\n"
             "/help - Xem danh sách lệnh này\n"
             "/ping - Kiểm tra trạng thái hệ thống\n"
-            "/cleanup - Dọn dẹp tin nhắn\n\n"
+            "/cleanup - Dọn dẹp tin nhắn\n"
+            "/perf <giây> - Đo xem bot đang tốn CPU ở đâu (admin)\n\n"
             "🔹 **Lệnh AI Chatbot:**\n"
             "/chat <tin nhắn> - Chat với AI\n"
             "/profiles - Xem danh sách profile AI\n"
-            "/profile <tên> - Đổi profile AI\n\n"
-            "💡 **Tip:** Gửi tin nhắn trực tiếp để chat với AI, không cần dùng lệnh!\n\n"
+            "/profile <tên> - Đổi profile AI\n"
+            "/reload - Tải lại profile và từ viết tắt (admin)\n"
+            "/groupmode <all|smart|mention|off> - Khi nào bot trả lời trong nhóm (admin)\n\n"
+            "💡 **Tip:** Gửi tin nhắn trực tiếp để chat với AI, không cần dùng lệnh! "
+            "Trong nhóm, hãy tag hoặc trả lời tin nhắn của bot.\n\n"
             "🤖 _Bot được tạo ra bởi Bóng X_"
         )
         await update.message.reply_text(help_text, parse_mode="Markdown")
 
 
     async def ping(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        ADMIN_ID = 7509896689
         start_time = time.monotonic()
         msg = await update.message.reply_text("Calculating...")
         end_time = time.monotonic()
         
         latency = (end_time - start_time) * 1000
         
-        # System Stats
+        # System Stats (psutil is only needed here, keep it off the startup path)
+        import psutil
         cpu_usage = psutil.cpu_percent()
         ram_usage = psutil.virtual_memory().percent
         
@@ -44,12 +54,88 @@ class GeneralHandler:
             f"📡 Latency: `{round(latency, 2)}ms`\n"
             f"💻 CPU Load: `{cpu_usage}%`\n"
             f"🧠 RAM Usage: `{ram_usage}%`\n"
+            f"{self._load_status()}"
+            f"{self._key_status() + self._model_status() if update.effective_user.id == ADMIN_ID else ''}"
             f"🐍 Python: `{platform.python_version()}`\n"
             f"⚙️ Lib: `python-telegram-bot`"
         )
         
         await msg.edit_text(text, parse_mode="Markdown")
 
+    def _load_status(self):
+        lines = ""
+        if self.monitor:
+            lag = self.monitor.percentiles()
+            if lag:
+                lines += (
+                    f"🔁 Loop Lag: `p50 {lag['p50']:.1f} / p95 {lag['p95']:.1f} / "
+                    f"p99 {lag['p99']:.1f} / max {lag['max']:.0f}ms`\n"
+                )
+        if self.scheduler:
+            lines += f"💬 Chats: `{self.scheduler.running} đang xử lý, {self.scheduler.queued} đang chờ`\n"
+        return lines
+
+    def _key_status(self):
+        pool = self.chatbot.key_pool if self.chatbot else None
+        if not pool:
+            return ""
+        lines = ""
+        for key in pool.stats():
+            if key["disabled"]:
+                state = "bị khoá"
+            elif key["cooldown"]:
+                state = f"nghỉ {key['cooldown']:.0f}s"
+            else:
+                state = f"còn {key['requests_left']:.0f} req, {key['tokens_left']} token"
+            lines += f"🔑 Key {key['index']}: `{key['in_flight']} đang gọi, {state}`\n"
+        return lines
+
+    def _model_status(self):
+        if not self.chatbot:
+            return ""
+        router = self.chatbot.router
+        lines = ""
+        for model, stats in router.summary().items():
+            if not stats["count"]:
+                continue
+            degraded = " ⚠️" if router.degraded(model) else ""
+            p95 = f"p95 {stats['p95']:.1f}s" if stats["p95"] is not None else "p95 -"
+            lines += (
+                f"🧩 `{model}`{degraded}: `{stats['count']} lần/{router.window:.0f}s, "
+                f"lỗi {stats['error_rate']:.0%}, {p95}`\n"
+            )
+        return lines
+
+    async def perf(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        ADMIN_ID = 7509896689
+        user_id = update.effective_user.id
+
+        if user_id != ADMIN_ID:
+            await update.message.reply_text("❌ Chỉ admin mới được dùng lệnh này!")
+            return
+        if not self.monitor:
+            await update.message.reply_text("❌ Chưa bật theo dõi event loop.")
+            return
+
+        try:
+            seconds = min(30.0, max(1.0, float(context.args[0]))) if context.args else 5.0
+        except ValueError:
+            seconds = 5.0
+        msg = await update.message.reply_text(f"⏱ Đang lấy mẫu {seconds:.0f}s...")
+        samples, rows = await self.monitor.profile(seconds)
+        if not samples:
+            await msg.edit_text("❌ Không lấy được mẫu nào.")
+            return
+
+        lines = [f"{own:5.1f}% {total:5.1f}%  {name}" for name, own, total in rows]
+        text = (
+            f"🔥 Top hàm trên event loop ({samples} mẫu, {seconds:.0f}s)\n"
+            f"  own  total  function\n" + "\n".join(lines) +
+            f"\n\nLoop bị chặn >{self.monitor.threshold * 1000:.0f}ms: {self.monitor.stalls} lần"
+        )
+        # Plain text: function names are full of underscores
+        await msg.edit_text(text[:4000])
+
     async def cleanup(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         ADMIN_ID = 7509896689
         user_id = update.effective_user.id
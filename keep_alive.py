@@ -1,12 +1,8 @@
-from flask import Flask
 from threading import Thread
 import os
+from utils.metrics import health_status, render_metrics
 
-app = Flask(__name__)
-
-@app.route('/')
-def home():
-    return """
+HOME_PAGE = """
     <html>
         <head>
             <title>Bóng X Bot</title>
@@ -52,13 +48,33 @@ def home():
     </html>
     """
 
-@app.route('/health')
-def health():
-    return {'status': 'ok', 'bot': 'running'}, 200
+def create_app():
+    # Flask is imported here, in the server thread, so it stays off the startup path
+    from flask import Flask, Response
+
+    app = Flask(__name__)
+
+    @app.route('/')
+    def home():
+        return HOME_PAGE
+
+    @app.route('/health')
+    def health():
+        ready, checks = health_status()
+        if ready:
+            return {'status': 'ok', 'bot': 'running', 'checks': checks}, 200
+        return {'status': 'degraded', 'bot': 'not ready', 'checks': checks}, 503
+
+    @app.route('/metrics')
+    def metrics():
+        body, content_type = render_metrics()
+        return Response(body, content_type=content_type)
+
+    return app
 
 def run():
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 
 def keep_alive():
     t = Thread(target=run)
@@ -1,17 +1,35 @@
 import os
+import asyncio
 import logging
+import secrets
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ContextTypes
 from dotenv import load_dotenv
+
+# Load Environment (before our modules, some read settings at import)
+load_dotenv()
+
 from utils.logger import log
 from handlers.chatbot import ChatbotHandler
 from handlers.general import GeneralHandler
 from keep_alive import keep_alive
+from utils.metrics import register_health_check
+from utils.scheduler import ChatUpdateProcessor
+from utils.outbound import OutboundDispatcher
+from utils.diagnostics import LoopMonitor
 
-# Load Environment
-load_dotenv()
 TOKEN = os.getenv("TELEGRAM_TOKEN")
 
+# "polling" (default) or "webhook"; webhook mode needs the public https URL Telegram should call
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+PORT = int(os.getenv("PORT", 5000))
+# Another Bot API server (a local one, or benchmarks/fake_telegram.py for load tests)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# >1 routes chats by chat_id to that many worker processes
+WORKERS = int(os.getenv("WORKERS", "1"))
+
 if not TOKEN:
     log.critical("Token not found in .env file! Exiting...")
     import sys
@@ -20,36 +38,94 @@ if not TOKEN:
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     log.error(f"Exc in update: {context.error}")
 
-def main():
-    log.info("--- Initializing Antigravity Telegram Bot ---")
-    
-    # Start keep-alive web server for Render
-    keep_alive()
-    
-    app = ApplicationBuilder().token(TOKEN).build()
-    
-    # Handlers
-    chatbot = ChatbotHandler()
-    general = GeneralHandler()
+def build_application(updater=True, ledger=None):
+    """
+    The full bot: chatbot and general handlers on a PTB Application.
+    Worker processes build it with updater=False and are fed updates by workers.py.
+    """
+    chatbot = ChatbotHandler(ledger=ledger)
+    monitor = LoopMonitor(threshold=float(os.getenv("LOOP_LAG_THRESHOLD", "0.25")))
+    general = GeneralHandler(monitor=monitor, scheduler=chatbot.scheduler, chatbot=chatbot)
+
+    async def post_init(application):
+        monitor.start()
+        await chatbot.start()
+        register_health_check("ai", lambda: bool(chatbot.key_pool))
+
+    async def post_shutdown(application):
+        # Flush queued chat history before the process exits
+        await chatbot.shutdown()
+        await monitor.close()
+
+    builder = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Chats run concurrently, in order within a chat, commands first, busy reply when flooded
+        .concurrent_updates(ChatUpdateProcessor(chatbot.scheduler))
+        # Every send is paced to Telegram's limits; workers split the global one
+        .rate_limiter(OutboundDispatcher(
+            global_per_second=float(os.getenv("TELEGRAM_GLOBAL_RATE", "30")) / WORKERS,
+            private_per_minute=int(os.getenv("TELEGRAM_PRIVATE_PER_MINUTE", "60")),
+            group_per_minute=int(os.getenv("TELEGRAM_GROUP_PER_MINUTE", "20")),
+        ))
+    )
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(TELEGRAM_API_URL.rstrip("/") + "/bot")
+    if not updater:
+        # Updates arrive through our own web server or the front process, no Updater needed
+        builder = builder.updater(None)
+    app = builder.build()
     
     # Register Commands
     app.add_handler(CommandHandler("start", general.start))
     app.add_handler(CommandHandler("help", general.help))
     app.add_handler(CommandHandler("ping", general.ping))
     app.add_handler(CommandHandler("cleanup", general.cleanup)) 
+    app.add_handler(CommandHandler("perf", general.perf))
     
     app.add_handler(CommandHandler("chat", chatbot.chat_command))
     app.add_handler(CommandHandler("profiles", chatbot.list_profiles))
     app.add_handler(CommandHandler("profile", chatbot.set_profile))
+    app.add_handler(CommandHandler("reload", chatbot.reload))
+    app.add_handler(CommandHandler("groupmode", chatbot.group_mode))
     
     # Message Handler (Chatbot)
     # Filters.text & ~Filters.COMMAND ensures we only reply to text that isn't a command
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, chatbot.on_message))
     
     app.add_error_handler(error_handler)
+    return app, chatbot
+
+def main():
+    log.info("--- Initializing Antigravity Telegram Bot ---")
+
+    use_webhook = BOT_MODE == "webhook"
+    if use_webhook and not WEBHOOK_URL:
+        log.warning("BOT_MODE=webhook but WEBHOOK_URL is not set, falling back to polling")
+        use_webhook = False
+
+    if not use_webhook:
+        # Start keep-alive web server for Render
+        keep_alive()
+
+    if WORKERS > 1:
+        # Front process only routes updates; chats are handled in the worker processes
+        from workers import build_front
+        app = build_front(TOKEN, WORKERS, updater=not use_webhook, api_url=TELEGRAM_API_URL)
+    else:
+        app, _ = build_application(updater=not use_webhook)
+
+    if not use_webhook:
+        register_health_check("polling", lambda: app.updater is not None and app.updater.running)
 
     log.info("--- System Operational ---")
-    app.run_polling()
+    if use_webhook:
+        from webhook import run_webhook
+        asyncio.run(run_webhook(app, WEBHOOK_URL, PORT, WEBHOOK_SECRET))
+    else:
+        app.run_polling()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from utils.cache import ConversationCache
+from utils.storage import ConversationStore
+
+
+class FlakyStore(ConversationStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.fail = False
+
+    def append_many(self, turns):
+        if self.fail:
+            return False
+        return super().append_many(turns)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = FlakyStore(str(tmp_path / "conversations.db"))
+    yield store
+    store.close()
+
+
+def test_failed_flush_keeps_turns(store):
+    cache = ConversationCache(store, window=4)
+    cache.append("1", "user", "alo")
+    store.fail = True
+    with pytest.raises(RuntimeError):
+        cache.flush()
+    cache.append("1", "assistant", "chào")
+
+    store.fail = False
+    assert cache.flush() == 2
+    assert store.last("1") == [("user", "alo"), ("assistant", "chào")]
+
+
+def test_dirty_users_are_not_evicted(store):
+    cache = ConversationCache(store, window=4, max_users=2)
+    store.fail = True
+    for user in range(5):
+        cache.append(user, "user", f"tin {user}")
+    with pytest.raises(RuntimeError):
+        cache.flush()
+    assert len(cache._windows) == 5
+
+    store.fail = False
+    cache.flush()
+    cache.append("9", "user", "mới")
+    assert len(cache._windows) == 2
+    # Evicted users reload their flushed turns from the store
+    assert cache.last("0") == [("user", "tin 0")]
+
+
+def test_overflow_is_flushed_by_the_background_task(store):
+    async def run():
+        cache = ConversationCache(store, window=4, flush_interval=60, max_pending=3)
+        cache.start()
+        for i in range(3):
+            cache.append("1", "user", f"tin {i}")
+        await asyncio.sleep(0.2)
+        flushed = len(store.last("1"))
+        await cache.close()
+        return flushed
+
+    assert asyncio.run(run()) == 3
@@ -0,0 +1,36 @@
+from collections import deque
+
+from utils.history import HistoryBuilder
+
+
+def _chat(builder, turns, count, size=10):
+    """Sends `count` short messages, returning the first history message of each request."""
+    firsts = []
+    for i in range(count):
+        turns.append(("user", f"u{i} " + "x" * size))
+        messages = builder.build("1", list(turns), "qwen-3-32b")
+        firsts.append(messages[0]["content"])
+        turns.append(("assistant", f"a{i} " + "y" * size))
+    return firsts
+
+
+def test_prefix_stays_stable_when_window_is_full():
+    builder = HistoryBuilder(max_turns=40)
+    firsts = _chat(builder, deque(maxlen=40), 100)
+    changes = sum(a != b for a, b in zip(firsts, firsts[1:]))
+    # Re-anchored about every (40 - 24) / 2 messages instead of on every one
+    assert changes <= 15
+
+
+def test_short_history_is_sent_whole():
+    builder = HistoryBuilder(max_turns=40)
+    firsts = _chat(builder, deque(maxlen=40), 5)
+    assert set(firsts) == {"u0 " + "x" * 10}
+
+
+def test_over_budget_trims_to_low_water():
+    builder = HistoryBuilder(budgets={"m": 100}, max_turns=40)
+    turns = [("user", "x" * 60)] * 10
+    messages = builder.build("1", turns, "m")
+    used = sum(len(m["content"]) // 3 + 4 for m in messages)
+    assert 0 < used <= 60
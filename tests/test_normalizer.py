@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from benchmarks.bench_normalizer import EDGE_CASES, check_equivalence
+from utils.normalizer import AbbreviationNormalizer, legacy_normalize
+
+
+@pytest.mark.parametrize("abbreviations, text", EDGE_CASES)
+def test_edge_cases_match_legacy(abbreviations, text):
+    assert AbbreviationNormalizer(abbreviations).normalize(text) == legacy_normalize(text, abbreviations)
+
+
+def test_random_dictionaries_match_legacy():
+    for seed in range(3):
+        check_equivalence({}, [], seed=seed)
+
+
+def test_shipped_dictionary_is_compiled():
+    with open("data/viettat.json", "r", encoding="utf-8") as f:
+        abbreviations = json.load(f)
+    assert AbbreviationNormalizer(abbreviations)._fallback is None
+
+
+def test_expansion_rescanned_by_later_entries():
+    abbreviations = {"hn": "hôm nay", "hôm": "hôm hôm"}
+    assert AbbreviationNormalizer(abbreviations).normalize("Hn đi") == "hôm hôm nay đi"
+
+
+def test_earlier_entry_shadows_phrase():
+    abbreviations = {"k": "không", "k bít": "không biết"}
+    assert AbbreviationNormalizer(abbreviations).normalize("k bít") == "không bít"
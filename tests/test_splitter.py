@@ -0,0 +1,111 @@
+import random
+import unicodedata
+
+import pytest
+
+from utils.splitter import MAX_MESSAGE_LENGTH, next_cut, split_message, utf16_len
+
+
+def _squash(text):
+    return "".join(text.split())
+
+
+def _random_text(rng, size, alphabet):
+    return "".join(rng.choice(alphabet) for _ in range(size))
+
+
+@pytest.mark.parametrize("max_length", [7, 50, 333, MAX_MESSAGE_LENGTH])
+@pytest.mark.parametrize("alphabet", [
+    "abc xyz.\n",
+    "😀🎉👍🏽 a\n",                     # astral characters take two UTF-16 units
+    "😀😂🤣",                            # emoji only, no separator at all
+    "tiếng việt 😀. ",
+])
+def test_chunks_fit_in_utf16_limit(max_length, alphabet):
+    rng = random.Random(max_length)
+    text = _random_text(rng, 5 * max_length + 17, alphabet)
+
+    chunks = split_message(text, max_length)
+
+    assert all(utf16_len(chunk) <= max_length for chunk in chunks)
+    # Only whitespace at the cuts is dropped
+    assert _squash("".join(chunks)) == _squash(text)
+
+
+def test_short_text_is_one_chunk():
+    assert split_message("xin chào 👋", 20) == ["xin chào 👋"]
+    assert split_message("   ", 20) == []
+
+
+@pytest.mark.parametrize("text, expected", [
+    # paragraph beats a later line, sentence and word break
+    ("aaaa\n\nbbbb\ncc. dd ee", "aaaa\n\n"),
+    # line beats a later sentence and word break
+    ("aaaa bb\ncc. dd ee ff", "aaaa bb\n"),
+    # sentence beats a later word break
+    ("aa bb. cc dd ee ff", "aa bb. "),
+    ("aa bb? cc dd ee ff", "aa bb? "),
+    # word break when there is nothing better
+    ("aaaa bbbb cccccccccc", "aaaa bbbb "),
+    # hard cut at the limit when there is no separator
+    ("abcdefghijklmnopqrstuvwxyz", "abcdefghijklmnop"),
+])
+def test_separator_priority(text, expected):
+    assert text[:next_cut(text, 0, 16)] == expected
+
+
+def test_separator_beyond_limit_is_not_used():
+    text = "abcdefgh ijklmnop\n\nqrst"
+    assert text[:next_cut(text, 0, 12)] == "abcdefgh "
+
+
+def test_no_cut_inside_combining_marks():
+    # "ví" decomposed: v, i, combining acute accent
+    word = unicodedata.normalize("NFD", "ví")
+    assert unicodedata.combining(word[-1])
+    text = word * 40
+
+    for max_length in range(2, 12):
+        chunks = split_message(text, max_length)
+        assert all(not unicodedata.combining(chunk[0]) for chunk in chunks)
+        assert all(utf16_len(chunk) <= max_length for chunk in chunks)
+        assert "".join(chunks) == text
+
+
+def test_astral_false_matches_for_bmp_text():
+    text = "Một câu. Hai câu nữa!\nDòng mới\n\nĐoạn mới với nhiều từ " * 30
+    for start in (0, 5, 123):
+        assert next_cut(text, start, 64, astral=False) == next_cut(text, start, 64)
+
+
+def test_incremental_cuts_from_offset():
+    # StreamingReply keeps `committed` and asks for the next cut from there
+    rng = random.Random(3)
+    text = _random_text(rng, 2_000, "ab cd. ef\n😀\n\n")
+    max_length = 100
+
+    committed = 0
+    pieces = []
+    while utf16_len(text[committed:]) > max_length:
+        cut = next_cut(text, committed, max_length)
+        assert committed < cut
+        assert utf16_len(text[committed:cut]) <= max_length
+        pieces.append(text[committed:cut])
+        committed = cut
+    pieces.append(text[committed:])
+
+    assert "".join(pieces) == text
+    # Cutting incrementally gives the same chunks as splitting at once
+    assert [p.strip() for p in pieces if p.strip()] == split_message(text, max_length)
+
+
+def test_cut_only_uses_separators_after_offset():
+    text = "aaaa\n\nbbbbbbbb cccccccc"
+    # The paragraph break lies before the offset; the word break after it wins
+    assert text[6:next_cut(text, 6, 12)] == "bbbbbbbb "
+
+
+def test_cut_at_end_of_text():
+    text = "xin chào 😀"
+    assert next_cut(text, 0, 100) == len(text)
+    assert next_cut(text, 4, 100) == len(text)
@@ -0,0 +1,30 @@
+import pytest
+
+from utils.response_cache import ResponseCache
+from utils.storage import ConversationStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    yield store
+    store.close()
+
+
+def test_chat_settings_are_upserted(store):
+    store.set_chat_setting(-100, "group_mode", "smart")
+    store.set_chat_setting(-200, "group_mode", "off")
+    store.set_chat_setting(-100, "group_mode", "mention")
+    assert store.chat_settings("group_mode") == {"-100": "mention", "-200": "off"}
+
+
+def test_response_caches_of_workers_are_merged(store):
+    first, second = ResponseCache(), ResponseCache()
+    first.put("a", "trả lời a")
+    second.put("b", "trả lời b")
+    first.save(store)
+    second.save(store)
+
+    loaded = ResponseCache()
+    loaded.load(store)
+    assert set(loaded._entries) == {"a", "b"}
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from utils.logger import log
+
+
+class ConversationCache:
+    """
+    Write-behind cache in front of ConversationStore.
+
+    Keeps the recent turn window of active users in memory (LRU, capped by user
+    count and total characters) and queues new turns for batched flushes, so the
+    chat path does no disk I/O on a cache hit. Users with queued turns stay
+    cached until those are written, so a cache miss never has to flush first.
+    A failed flush keeps its turns queued for the next one.
+    """
+
+    def __init__(self, store, window=20, max_users=5000, max_chars=20_000_000,
+                 flush_interval=2.0, max_pending=500):
+        self.store = store
+        self.window = window
+        self.max_users = max_users
+        self.max_chars = max_chars
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._windows = OrderedDict()  # user_id -> deque[(role, content)]
+        self._chars = 0
+        self._pending = []
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def _window(self, user_id):
+        with self._lock:
+            window = self._windows.get(user_id)
+            if window is not None:
+                self._windows.move_to_end(user_id)
+                return window
+
+        # Not cached means nothing queued (see _evict), so the store is complete
+        turns = self.store.last(user_id, self.window)
+
+        with self._lock:
+            window = self._windows.get(user_id)
+            if window is None:
+                window = deque(turns, maxlen=self.window)
+                self._windows[user_id] = window
+                self._chars += sum(len(content) for _, content in window)
+                self._evict()
+            return window
+
+    def _evict(self):
+        count, chars = len(self._windows), self._chars
+        victims = []
+        for user_id, window in self._windows.items():  # least recently used first
+            if count <= self.max_users and chars <= self.max_chars:
+                break
+            if user_id in self._dirty:
+                continue  # its queued turns aren't in the store yet
+            victims.append(user_id)
+            count -= 1
+            chars -= sum(len(content) for _, content in window)
+        for user_id in victims:
+            del self._windows[user_id]
+        self._chars = chars
+
+    def last(self, user_id, limit=None):
+        """
+        Returns up to `limit` recent turns of a user, oldest first, as (role, content).
+        """
+        window = self._window(str(user_id))
+        with self._lock:
+            turns = list(window)
+        if limit is not None:
+            turns = turns[-limit:] if limit > 0 else []
+        return turns
+
+    def append(self, user_id, role, content):
+        user_id = str(user_id)
+        window = self._window(user_id)
+        with self._lock:
+            if user_id not in self._windows:
+                # Evicted right after loading; it must stay cached while dirty
+                self._windows[user_id] = window
+                self._chars += sum(len(content) for _, content in window)
+            if len(window) == window.maxlen:
+                self._chars -= len(window[0][1])
+            window.append((role, content))
+            self._chars += len(content)
+
+            self._pending.append((user_id, role, content, time.time()))
+            self._dirty.add(user_id)
+            self._evict()
+            overflow = len(self._pending) >= self.max_pending
+
+        if overflow:
+            if self._task is not None:
+                self._wakeup.set()  # flush now, off the event loop
+            else:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes all queued turns to the store in a single transaction. On a
+        failed write they are queued again, ahead of newer turns, and it raises.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            written = self.store.append_many(pending) if pending else True
+            with self._lock:
+                if not written:
+                    self._pending[:0] = pending
+                self._dirty = {turn[0] for turn in self._pending}
+        if not written:
+            raise RuntimeError(f"{len(pending)} turns kept for the next flush")
+        return len(pending)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception as e:
+                log.error(f"Conversation flush failed: {e}")
+                # Back off rather than retry on every queued turn
+                await asyncio.sleep(self.flush_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            flushed = await asyncio.to_thread(self.flush)
+        except Exception as e:
+            log.error(f"Conversation flush failed on shutdown, turns lost: {e}")
+            return
+        if flushed:
+            log.info(f"Flushed {flushed} pending turns on shutdown")
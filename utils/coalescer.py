@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+from utils.logger import log
+
+_current_batch = contextvars.ContextVar("coalescer_batch", default=None)
+
+
+class Batch:
+    def __init__(self):
+        self.texts = []
+        self.update = None
+        self.task = None
+        self.started = False
+        self.committed = False
+
+
+class MessageCoalescer:
+    """
+    Debounces bursts of messages from the same sender in the same chat.
+
+    Messages that arrive within `window` seconds of each other are joined into
+    one request. A message that arrives while the previous batch is still
+    generating cancels that generation and is answered together with it,
+    unless the batch already called commit() (i.e. started replying).
+    """
+
+    def __init__(self, process, window=0.7):
+        self.process = process
+        self.window = window
+        self._batches = {}
+        self.merged = 0  # messages folded into an earlier one
+        self.cancelled = 0  # generations abandoned for newer input
+
+    async def submit(self, key, update, text):
+        if self.window <= 0:
+            await self.process(update, text)
+            return
+
+        batch = self._batches.get(key)
+        texts = []
+        if batch is not None and not batch.committed:
+            texts = batch.texts
+            self.merged += 1
+            if not batch.task.done():
+                batch.task.cancel()
+                if batch.started:
+                    self.cancelled += 1
+
+        batch = Batch()
+        batch.texts = texts + [text]
+        batch.update = update
+        batch.task = asyncio.create_task(self._run(key, batch))
+        batch.task.add_done_callback(self._report)
+        self._batches[key] = batch
+
+    async def _run(self, key, batch):
+        _current_batch.set(batch)
+        try:
+            await asyncio.sleep(self.window)
+            batch.started = True
+            await self.process(batch.update, "\n".join(batch.texts))
+        finally:
+            if self._batches.get(key) is batch:
+                del self._batches[key]
+
+    @staticmethod
+    def _report(task):
+        if not task.cancelled() and task.exception():
+            log.error(f"Coalesced chat failed: {task.exception()}")
+
+    def commit(self):
+        """
+        Marks the running batch as replying; later messages start a new batch.
+        No-op outside a coalesced task.
+        """
+        batch = _current_batch.get()
+        if batch is not None:
+            batch.committed = True
+
+    async def close(self):
+        tasks = [batch.task for batch in self._batches.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,115 @@
+import asyncio
+import collections
+import sys
+import threading
+import time
+import traceback
+from utils.logger import log
+from utils.metrics import LOOP_LAG_SECONDS
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and reports code that blocks the loop.
+
+    A task sleeps `interval` seconds and records how late it wakes up. A
+    watchdog thread checks that task's heartbeat; when the loop has been stuck
+    for more than `threshold` seconds it logs the loop thread's stack, i.e.
+    the handler that is blocking it, once per stall.
+    """
+
+    def __init__(self, interval=0.5, threshold=0.25, window=600):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags = collections.deque(maxlen=window)
+        self.stalls = 0
+        self._heartbeat = time.monotonic()
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self.lags.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            # The heartbeat is expected every `interval`; anything beyond that is blocking
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or reported == heartbeat:
+                continue
+            reported = heartbeat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame, limit=12)) if frame else "(no frame)"
+            log.warning(f"Event loop blocked for {stalled * 1000:.0f}ms+ in:\n{stack.rstrip()}")
+
+    def percentiles(self):
+        """
+        Recent lag in milliseconds: {"p50", "p95", "p99", "max"}, empty before the first sample.
+        """
+        if not self.lags:
+            return {}
+        ordered = sorted(self.lags)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+        return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": ordered[-1] * 1000}
+
+    async def profile(self, seconds=5.0, interval=0.005, top=10):
+        """
+        Samples the loop thread's stack for `seconds` without stopping it.
+        Returns (samples, [(function, own %, total %), ...]) sorted by own time.
+        """
+        return await asyncio.to_thread(sample_thread, self._loop_thread, seconds, interval, top)
+
+    async def close(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def sample_thread(thread_id, seconds, interval=0.005, top=10):
+    """
+    Poor man's sampling profiler: counts which functions are on `thread_id`'s stack.
+    "own" is the innermost frame, "total" any frame (each function once per sample).
+    """
+    own = collections.Counter()
+    total = collections.Counter()
+    samples = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            samples += 1
+            own[_describe(frame)] += 1
+            seen = set()
+            while frame is not None:
+                seen.add(_describe(frame))
+                frame = frame.f_back
+            total.update(seen)
+        time.sleep(interval)
+
+    if not samples:
+        return 0, []
+    rows = [(name, count * 100 / samples, total[name] * 100 / samples) for name, count in own.most_common(top)]
+    return samples, rows
+
+
+def _describe(frame):
+    code = frame.f_code
+    filename = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{'/'.join(filename[-2:])}:{code.co_firstlineno} {code.co_name}"
@@ -0,0 +1,104 @@
+import os
+import random
+import re
+from telegram.constants import ChatType, MessageEntityType
+from utils.metrics import ENGAGEMENT_DECISIONS
+from utils.normalizer import WORD_RE
+
+# How the bot takes part in a group chat
+ALL = "all"          # every message, like a private chat
+SMART = "smart"      # mentions, replies to the bot, keywords/its name, plus a sampled share of the rest
+MENTION = "mention"  # only mentions and replies to the bot
+OFF = "off"          # never (commands still work)
+MODES = (ALL, SMART, MENTION, OFF)
+
+
+class EngagementPolicy:
+    """
+    Decides whether a text message gets an AI reply, before it is coalesced,
+    queued, stored or sent to the model.
+
+    Private chats are always answered. Groups follow their mode from
+    set_mode(), else `default_mode`; messages with no words left after
+    normalization are ignored there. decide() returns the reason for
+    answering, or None, and counts every decision in bot_engagement_total.
+    """
+
+    def __init__(self, default_mode=SMART, keywords=(), sample_rate=0.0, modes=None, rng=None):
+        self.default_mode = default_mode
+        self.keywords = [k.strip().lower() for k in keywords if k.strip()]
+        self.sample_rate = sample_rate
+        self.modes = dict(modes or {})  # chat_id (str, as stored in JSON) -> mode
+        self.rng = rng or random.Random()
+        self._names = None  # (bot username, compiled keyword/name pattern)
+
+    @classmethod
+    def from_env(cls, modes=None):
+        return cls(
+            default_mode=os.getenv("GROUP_REPLY_MODE", SMART),
+            keywords=os.getenv("GROUP_KEYWORDS", "").split(","),
+            sample_rate=float(os.getenv("GROUP_SAMPLE_RATE", "0")),
+            modes=modes,
+        )
+
+    def mode(self, chat_id):
+        return self.modes.get(str(chat_id), self.default_mode)
+
+    def set_mode(self, chat_id, mode):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode}")
+        self.modes[str(chat_id)] = mode
+
+    def decide(self, message, bot, text):
+        """
+        `text` is the normalized message text; `bot` is the replying telegram.Bot.
+        """
+        reply, reason = self._decide(message, bot, text)
+        ENGAGEMENT_DECISIONS.labels("reply" if reply else "skip", reason).inc()
+        return reason if reply else None
+
+    def _decide(self, message, bot, text):
+        if message.chat.type == ChatType.PRIVATE:
+            return True, "private"
+        mode = self.mode(message.chat.id)
+        if mode == OFF:
+            return False, "off"
+        if not WORD_RE.search(text):
+            return False, "empty"
+        if mode == ALL:
+            return True, "all"
+        if self._replies_to(message, bot):
+            return True, "reply"
+        if self._mentions(message, bot):
+            return True, "mention"
+        if mode == SMART:
+            if self._pattern(bot).search(text):
+                return True, "keyword"
+            if self.sample_rate and self.rng.random() < self.sample_rate:
+                return True, "sampled"
+        return False, "not_addressed"
+
+    def _replies_to(self, message, bot):
+        replied = message.reply_to_message
+        return bool(replied and replied.from_user and replied.from_user.id == bot.id)
+
+    def _mentions(self, message, bot):
+        if bot.username and f"@{bot.username.lower()}" in (message.text or "").lower():
+            return True
+        return any(
+            entity.type == MessageEntityType.TEXT_MENTION and entity.user and entity.user.id == bot.id
+            for entity in message.entities
+        )
+
+    def _pattern(self, bot):
+        username = bot.username or ""
+        if self._names is None or self._names[0] != username:
+            names = set(self.keywords)
+            for name in (bot.first_name, username):
+                if name:
+                    names.add(name.lower())
+            alternatives = "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+            # Matches nothing when there are no keywords and the bot has no name
+            pattern = re.compile(rf"(?<!\w)(?:{alternatives})(?!\w)" if alternatives else r"(?!)", re.IGNORECASE)
+            self._names = (username, pattern)
+        return self._names[1]
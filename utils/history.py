@@ -0,0 +1,127 @@
+import asyncio
+from collections import OrderedDict
+from utils.logger import log
+
+# Input-token budget for chat history per model (system prompt and the new
+# message come on top of this)
+HISTORY_BUDGETS = {
+    "qwen-3-32b": 2500,
+}
+DEFAULT_BUDGET = 2000
+
+
+def estimate_tokens(text):
+    # ~3 chars per token for Vietnamese text, plus per-message framing
+    return len(text) // 3 + 4
+
+
+class HistoryBuilder:
+    """
+    Turns stored (role, content) pairs into chat messages within a token budget.
+
+    Once history has to be trimmed, it is cut down to `low_water` of the budget
+    and that starting turn is remembered per user. Later requests keep the same
+    start until the budget is exceeded again, so the system prompt + history
+    prefix stays byte-identical across turns and provider prompt caching can
+    hit. `max_turns` is the size of the stored window the turns come from: when
+    the window is full or the start has slid out of it, history is trimmed the
+    same way (to `low_water` of the window too) rather than starting at
+    whichever turn is oldest right now. Dropped turns can be folded into a
+    rolling summary that is generated in the background and shown to the
+    model from the next request on.
+    """
+
+    def __init__(self, summarize=None, budgets=None, low_water=0.6, max_users=10000, max_turns=None):
+        self.summarize = summarize
+        self.budgets = dict(HISTORY_BUDGETS, **(budgets or {}))
+        self.low_water = low_water
+        self.max_users = max_users
+        self.max_turns = max_turns
+
+        self._anchors = OrderedDict()  # user_id -> first kept (role, content)
+        self._summaries = OrderedDict()  # user_id -> summary text
+        self._tasks = {}
+
+    def budget(self, model):
+        return self.budgets.get(model, DEFAULT_BUDGET)
+
+    def _remember(self, table, user_id, value):
+        table[user_id] = value
+        table.move_to_end(user_id)
+        while len(table) > self.max_users:
+            table.popitem(last=False)
+
+    def build(self, user_id, turns, model):
+        """
+        Chat messages for the model, oldest first, summary (if any) leading.
+        """
+        budget = self.budget(model)
+        sizes = [estimate_tokens(content) for _, content in turns]
+
+        anchored = self._anchor_index(user_id, turns)
+        # The window's oldest turn changes with every message once it is full
+        sliding = anchored is None or (
+            anchored == 0 and self.max_turns is not None and len(turns) >= self.max_turns
+        )
+        anchored = anchored or 0
+        start = anchored if not sliding and sum(sizes[anchored:]) <= budget else None
+        if start is None:
+            # Over budget or window: trim to the low-water mark and pin the new start
+            start = len(turns)
+            used = 0
+            target = budget * self.low_water
+            min_start = len(turns) - int(self.max_turns * self.low_water) if self.max_turns else 0
+            while start > max(0, min_start) and used + sizes[start - 1] <= target:
+                start -= 1
+                used += sizes[start]
+            if start < len(turns):
+                self._remember(self._anchors, user_id, turns[start])
+            if start > anchored:
+                # Turns before the old anchor are already in the summary
+                self._schedule_summary(user_id, turns[anchored:start])
+
+        messages = []
+        summary = self._summaries.get(user_id)
+        if summary:
+            messages.append({"role": "system", "content": f"Tóm tắt cuộc trò chuyện trước đó:\n{summary}"})
+        messages.extend({"role": role, "content": content} for role, content in turns[start:])
+        return messages
+
+    def _anchor_index(self, user_id, turns):
+        """
+        Index of the pinned start in `turns`: 0 without one, None once it left the window.
+        """
+        anchor = self._anchors.get(user_id)
+        if anchor is None:
+            return 0
+        try:
+            return turns.index(anchor)
+        except ValueError:
+            return None
+
+    def _schedule_summary(self, user_id, dropped):
+        if self.summarize is None or user_id in self._tasks:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        previous = self._summaries.get(user_id, "")
+        task = loop.create_task(self._summarize(user_id, previous, list(dropped)))
+        self._tasks[user_id] = task
+
+    async def _summarize(self, user_id, previous, dropped):
+        try:
+            summary = await self.summarize(previous, dropped)
+            if summary:
+                self._remember(self._summaries, user_id, summary)
+        except Exception as e:
+            log.warning(f"History summary failed for {user_id}: {e}")
+        finally:
+            self._tasks.pop(user_id, None)
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
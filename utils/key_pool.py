@@ -0,0 +1,297 @@
+import asyncio
+import multiprocessing
+import time
+from utils.logger import log
+
+
+class NoKeysAvailable(Exception):
+    pass
+
+
+def status_code(error):
+    """
+    HTTP status of an SDK (APIStatusError) or httpx error, None for anything else.
+    """
+    code = getattr(error, "status_code", None)
+    if code is not None:
+        return code
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute / 60` per second.
+    Holds up to `burst` tokens, a full minute's worth by default.
+    """
+
+    def __init__(self, per_minute, burst=None):
+        self.capacity = float(per_minute if burst is None else burst)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= amount
+
+    def give(self, amount, now):
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class KeyLedger:
+    """
+    Key budgets shared between worker processes, so N workers together stay
+    within each key's limits. Create it in the parent and pass it to the
+    workers; each key uses one row of shared doubles:
+    [requests, requests_updated, tokens, tokens_updated, cooldown_until, disabled].
+    """
+
+    FIELDS = 6
+
+    def __init__(self, max_keys=64, context=multiprocessing):
+        self.max_keys = max_keys
+        self.values = context.Array("d", max_keys * self.FIELDS)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    TokenBucket whose state lives in a KeyLedger row; time.monotonic() is system-wide.
+    Racing workers can overdraw by one reservation, which the next refill pays back.
+    """
+
+    def __init__(self, values, offset, per_minute):
+        self._values = values
+        self._offset = offset
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        with values.get_lock():
+            if values[offset + 1] == 0:
+                values[offset] = self.capacity
+                values[offset + 1] = time.monotonic()
+
+    @property
+    def tokens(self):
+        return self._values[self._offset]
+
+    @tokens.setter
+    def tokens(self, value):
+        self._values[self._offset] = value
+
+    @property
+    def updated(self):
+        return self._values[self._offset + 1]
+
+    @updated.setter
+    def updated(self, value):
+        self._values[self._offset + 1] = value
+
+    def wait_time(self, amount, now):
+        with self._values.get_lock():
+            return super().wait_time(amount, now)
+
+    def take(self, amount, now):
+        with self._values.get_lock():
+            super().take(amount, now)
+
+    def give(self, amount, now):
+        with self._values.get_lock():
+            super().give(amount, now)
+
+
+class KeyState:
+    def __init__(self, index, key, requests_per_minute, tokens_per_minute):
+        self.index = index
+        self.key = key
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.disabled = False
+
+    def wait_time(self, tokens, now):
+        if self.cooldown_until > now:
+            return self.cooldown_until - now
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+
+class SharedKeyState(KeyState):
+    """
+    KeyState whose budgets, cooldown and 401 flag are shared through a KeyLedger.
+    in_flight stays per process.
+    """
+
+    def __init__(self, index, key, requests_per_minute, tokens_per_minute, ledger):
+        self.index = index
+        self.key = key
+        self._values = ledger.values
+        self._base = index * KeyLedger.FIELDS
+        self.requests = SharedTokenBucket(self._values, self._base, requests_per_minute)
+        self.tokens = SharedTokenBucket(self._values, self._base + 2, tokens_per_minute)
+        self.in_flight = 0
+
+    @property
+    def cooldown_until(self):
+        return self._values[self._base + 4]
+
+    @cooldown_until.setter
+    def cooldown_until(self, value):
+        self._values[self._base + 4] = value
+
+    @property
+    def disabled(self):
+        return bool(self._values[self._base + 5])
+
+    @disabled.setter
+    def disabled(self, value):
+        self._values[self._base + 5] = 1.0 if value else 0.0
+
+
+class KeyPool:
+    """
+    Spreads completions over every API key at once.
+
+    Each key has request and token budgets per minute. acquire() picks the
+    least-loaded key that has budget left and waits for the earliest one
+    otherwise. Keys that return 429 cool down for Retry-After seconds, and
+    keys that return 401 are disabled for the rest of the process.
+    With a KeyLedger the budgets, cooldowns and disabled flags are shared
+    with the other worker processes.
+    """
+
+    def __init__(self, keys, requests_per_minute=30, tokens_per_minute=60000, default_cooldown=10.0,
+                 ledger=None):
+        self.default_cooldown = default_cooldown
+        if ledger is not None and len(keys) > ledger.max_keys:
+            log.warning(f"Key ledger holds {ledger.max_keys} keys, the other {len(keys) - ledger.max_keys} are not shared")
+        self.states = [
+            SharedKeyState(i, key, requests_per_minute, tokens_per_minute, ledger)
+            if ledger is not None and i < ledger.max_keys
+            else KeyState(i, key, requests_per_minute, tokens_per_minute)
+            for i, key in enumerate(keys)
+        ]
+        self._changed = asyncio.Event()
+
+    def healthy(self):
+        return [s for s in self.states if not s.disabled]
+
+    def __bool__(self):
+        return bool(self.healthy())
+
+    async def acquire(self, estimated_tokens=1000, exclude=()):
+        """
+        Reserves budget on the best key and returns its KeyState.
+        Pair every call with release().
+        """
+        while True:
+            state, wait = self._take(estimated_tokens, exclude)
+            if state is not None:
+                return state
+
+            # Wake early if a release or cooldown change frees a key
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def try_acquire(self, estimated_tokens=1000, exclude=()):
+        """
+        Like acquire() but only takes a key that has budget right now; None otherwise.
+        """
+        try:
+            state, _ = self._take(estimated_tokens, exclude)
+        except NoKeysAvailable:
+            return None
+        return state
+
+    def _take(self, estimated_tokens, exclude):
+        # Reserves the best ready key: (state, None), or (None, seconds until one may be ready)
+        now = time.monotonic()
+        candidates = [s for s in self.healthy() if s.key not in exclude]
+        if not candidates:
+            raise NoKeysAvailable("All API Keys exhausted.")
+
+        ready = []
+        wait = None
+        for state in candidates:
+            tokens = min(estimated_tokens, state.tokens.capacity)
+            delay = state.wait_time(tokens, now)
+            if delay <= 0:
+                ready.append(state)
+            elif wait is None or delay < wait:
+                wait = delay
+
+        if not ready:
+            return None, wait
+        state = min(ready, key=lambda s: (s.in_flight, -s.tokens.tokens))
+        state.requests.take(1, now)
+        state.tokens.take(min(estimated_tokens, state.tokens.capacity), now)
+        state.in_flight += 1
+        return state, None
+
+    def release(self, state, estimated_tokens=0, used_tokens=None):
+        """
+        Returns a key after a call; refunds the unused part of the token reservation.
+        """
+        state.in_flight = max(0, state.in_flight - 1)
+        if used_tokens is not None:
+            reserved = min(estimated_tokens, state.tokens.capacity)
+            now = time.monotonic()
+            if used_tokens < reserved:
+                state.tokens.give(reserved - used_tokens, now)
+            else:
+                state.tokens.take(used_tokens - reserved, now)
+        self._changed.set()
+
+    def cooldown(self, state, retry_after=None):
+        seconds = retry_after if retry_after is not None else self.default_cooldown
+        state.cooldown_until = max(state.cooldown_until, time.monotonic() + seconds)
+        log.warning(f"API Key index {state.index} rate limited, cooling down {seconds:.1f}s")
+        self._changed.set()
+
+    def disable(self, state):
+        if not state.disabled:
+            state.disabled = True
+            log.error(f"API Key index {state.index} rejected (401), disabled")
+        self._changed.set()
+
+    def stats(self):
+        now = time.monotonic()
+        for s in self.states:
+            # Refills the buckets, so the levels are current
+            s.requests.wait_time(0, now)
+            s.tokens.wait_time(0, now)
+        return [
+            {
+                "index": s.index,
+                "in_flight": s.in_flight,
+                "disabled": s.disabled,
+                "cooldown": max(0.0, s.cooldown_until - now),
+                "requests_left": round(s.requests.tokens, 1),
+                "tokens_left": round(s.tokens.tokens),
+            }
+            for s in self.states
+        ]
@@ -1,14 +1,31 @@
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
 import sys
 from colorama import Fore, Style, init
 
 init(autoreset=True)
 
+# "text" (coloured, default) or "json" (one compact object per line)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Chat text is cut to this many characters in logs
+LOG_CHAT_CHARS = int(os.getenv("LOG_CHAT_CHARS", "200"))
+# Fraction of chats whose content is logged at all (1 = every chat)
+LOG_CHAT_SAMPLE = float(os.getenv("LOG_CHAT_SAMPLE", "1"))
+
+# Set per update by the scheduler; every record logged while handling that update carries it
+correlation_id = contextvars.ContextVar("correlation_id", default=None)
+
 class AntigravityFormatter(logging.Formatter):
     """
     Custom logging formatter for that God-Tier terminal aesthetic.
     """
-    
+
     FORMATS = {
         logging.DEBUG:    Fore.CYAN + "[DEBUG]   " + Style.RESET_ALL + " %(message)s",
         logging.INFO:     Fore.GREEN + "[INFO]    " + Style.RESET_ALL + " %(message)s",
@@ -17,19 +34,68 @@ class AntigravityFormatter(logging.Formatter):
         logging.CRITICAL: Fore.RED + Style.BRIGHT + "[CRITICAL]" + Style.RESET_ALL + " %(message)s"
     }
 
+    def __init__(self):
+        super().__init__()
+        # Built once per level instead of once per record
+        self._formatters = {
+            level: logging.Formatter(fmt, datefmt='%Y-%m-%d %H:%M:%S')
+            for level, fmt in self.FORMATS.items()
+        }
+        self._fallback = logging.Formatter(datefmt='%Y-%m-%d %H:%M:%S')
+
+    def format(self, record):
+        return self._formatters.get(record.levelno, self._fallback).format(record)
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Compact JSON lines for log collectors: ts, level, msg and cid (the update id) when set.
+    Tracebacks arrive already folded into msg by the QueueHandler.
+    """
+
     def format(self, record):
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt, datefmt='%Y-%m-%d %H:%M:%S')
-        return formatter.format(record)
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "msg": record.getMessage()}
+        cid = getattr(record, "cid", None)
+        if cid is not None:
+            entry["cid"] = cid
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+class CorrelationFilter(logging.Filter):
+    # Runs in the logging caller, where the update's context is still current
+    def filter(self, record):
+        record.cid = correlation_id.get()
+        return True
+
+def sample_chat():
+    """
+    Whether to log the content of this chat (LOG_CHAT_SAMPLE of them).
+    """
+    return LOG_CHAT_SAMPLE >= 1 or random.random() < LOG_CHAT_SAMPLE
+
+def clip(text, limit=None):
+    """
+    Chat text cut for logging, noting how much was left out.
+    """
+    limit = LOG_CHAT_CHARS if limit is None else limit
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... (+{len(text) - limit} chars)"
 
 def setup_logger():
     handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(AntigravityFormatter())
-    
+    handler.setFormatter(JsonLinesFormatter() if LOG_FORMAT == "json" else AntigravityFormatter())
+
+    # The event loop only enqueues records; a listener thread does the formatting and writing
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(CorrelationFilter())
+    listener = logging.handlers.QueueListener(records, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
     logger = logging.getLogger("BotTele")
     logger.setLevel(logging.INFO)
-    logger.addHandler(handler)
-    
+    logger.addHandler(queue_handler)
+
     return logger
 
 log = setup_logger()
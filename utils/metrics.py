@@ -0,0 +1,103 @@
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+STAGE_SECONDS = Histogram(
+    "bot_chat_stage_seconds",
+    "Time spent in each stage of handling a chat message",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+CHATS_IN_FLIGHT = Gauge("bot_chats_in_flight", "Chat messages currently being processed")
+SCHEDULER_QUEUED = Gauge("bot_scheduler_queued", "Updates waiting for their chat's turn or a free slot")
+SCHEDULER_SHED = Counter("bot_scheduler_shed_total", "Updates answered with a busy reply instead of processed")
+OUTBOUND_QUEUED = Gauge("bot_outbound_queued", "Telegram requests waiting for their chat's turn or a rate limit token")
+OUTBOUND_WAIT_SECONDS = Histogram(
+    "bot_outbound_wait_seconds",
+    "Time a Telegram request waited in the outbound dispatcher",
+    ["priority"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 30, 60),
+)
+OUTBOUND_RETRY_AFTER = Counter("bot_outbound_retry_after_total", "Telegram flood-control (429) answers")
+OUTBOUND_COLLAPSED = Counter("bot_outbound_collapsed_total", "Chat actions skipped because one was still showing")
+RESPONSE_CACHE = Counter("bot_response_cache_total", "Response cache lookups by result", ["result"])
+ENGAGEMENT_DECISIONS = Counter(
+    "bot_engagement_total",
+    "Text messages answered or skipped before any LLM work, by reason",
+    ["decision", "reason"],
+)
+
+LOOP_LAG_SECONDS = Histogram(
+    "bot_event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled to wake it",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+LLM_TOKENS = Counter("bot_llm_tokens_total", "LLM tokens used", ["direction"])
+LLM_MODEL_TOKENS = Counter("bot_llm_model_tokens_total", "LLM tokens used per model", ["model", "direction"])
+LLM_MODEL_SECONDS = Histogram(
+    "bot_llm_model_seconds",
+    "Completion latency per model (until the first chunk when streaming)",
+    ["model"],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+)
+LLM_MODEL_ERRORS = Counter("bot_llm_model_errors_total", "Failed completions per model", ["model", "kind"])
+LLM_ROUTES = Counter("bot_llm_routes_total", "Chat completions per first-choice model and tier", ["model", "tier"])
+KEY_REQUESTS = Counter("bot_api_key_requests_total", "Completions sent per API key", ["key"])
+KEY_ERRORS = Counter("bot_api_key_errors_total", "Failed completions per API key", ["key", "status"])
+KEY_ROTATIONS = Counter("bot_api_key_rotations_total", "Retries moved off a failing API key", ["key"])
+LLM_HEDGES = Counter(
+    "bot_llm_hedges_total",
+    "Slow completions duplicated on a second API key, by which request answered first",
+    ["winner"],
+)
+
+STORAGE_SECONDS = Histogram(
+    "bot_storage_seconds",
+    "Storage operation latency",
+    ["op", "file"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+
+_health_checks = {}
+
+
+def stage(name):
+    """
+    Context manager timing one chat stage: `with stage("llm"): ...`
+    """
+    return STAGE_SECONDS.labels(name).time()
+
+
+def record_usage(usage, model=None):
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", None)
+    completion = getattr(usage, "completion_tokens", None)
+    if prompt:
+        LLM_TOKENS.labels("in").inc(prompt)
+        if model:
+            LLM_MODEL_TOKENS.labels(model, "in").inc(prompt)
+    if completion:
+        LLM_TOKENS.labels("out").inc(completion)
+        if model:
+            LLM_MODEL_TOKENS.labels(model, "out").inc(completion)
+
+
+def register_health_check(name, check):
+    """
+    Adds a readiness check; `check` returns True when that part is healthy.
+    """
+    _health_checks[name] = check
+
+
+def health_status():
+    checks = {}
+    for name, check in _health_checks.items():
+        try:
+            checks[name] = bool(check())
+        except Exception:
+            checks[name] = False
+    return all(checks.values()), checks
+
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
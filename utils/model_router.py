@@ -0,0 +1,167 @@
+import collections
+import os
+import re
+import time
+from utils.metrics import LLM_MODEL_SECONDS, LLM_MODEL_ERRORS, LLM_ROUTES
+
+SMALL = "small"
+LARGE = "large"
+
+# Words that make even a short message a real question for the large model
+QUESTION_RE = re.compile(
+    r"\?|\b(sao|gì|gi|nào|nao|bao nhiêu|bao giờ|ở đâu|tại sao|vì sao|thế nào|như nào|"
+    r"giải thích|hướng dẫn|cách|viết|tính|dịch|so sánh|why|how|what|explain)\b",
+    re.IGNORECASE,
+)
+
+# Qwen 3 thinks before answering unless told not to; clean_response drops the thoughts anyway
+NO_THINK = {"qwen-3": "/no_think"}
+
+
+class ModelStats:
+    """
+    Latency and errors of one model over the last `window` seconds.
+    Old samples age out, so a model that was routed away from recovers on its own.
+    """
+
+    def __init__(self, window=120.0):
+        self.window = window
+        self.samples = collections.deque()  # (monotonic time, seconds or None on error)
+
+    def observe(self, seconds=None, now=None):
+        self.samples.append((now or time.monotonic(), seconds))
+
+    def _prune(self, now):
+        while self.samples and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def snapshot(self, now=None):
+        now = now or time.monotonic()
+        self._prune(now)
+        latencies = sorted(s for _, s in self.samples if s is not None)
+        count = len(self.samples)
+        errors = count - len(latencies)
+
+        def quantile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+        return {
+            "count": count,
+            "errors": errors,
+            "error_rate": errors / count if count else 0.0,
+            "p50": quantile(0.5),
+            "p95": quantile(0.95),
+        }
+
+
+class ModelRouter:
+    """
+    Picks the model chain for a message.
+
+    Short chit-chat goes to the small model and everything else to the large
+    one; a profile can override the models, max_tokens, temperature and
+    reasoning. The rest of the chain (the other tier, then LLM_FALLBACK_MODELS)
+    is what ChatbotHandler falls back to when a model fails. Models whose
+    recent error rate or p95 latency is over the limit move to the back of
+    the chain until their stats recover.
+    """
+
+    def __init__(self, large, small="", fallbacks=(), short_chars=40, small_max_tokens=300,
+                 max_error_rate=0.5, max_p95=15.0, min_samples=5, window=120.0):
+        self.large = large
+        self.small = small
+        self.fallbacks = [m for m in fallbacks if m]
+        self.short_chars = short_chars
+        self.small_max_tokens = small_max_tokens
+        self.max_error_rate = max_error_rate
+        self.max_p95 = max_p95
+        self.min_samples = min_samples
+        self.window = window
+        self.stats = {}
+
+    @classmethod
+    def from_env(cls, large):
+        return cls(
+            large=os.getenv("LLM_MODEL", large),
+            small=os.getenv("LLM_SMALL_MODEL", "llama3.1-8b"),
+            fallbacks=os.getenv("LLM_FALLBACK_MODELS", "").split(","),
+            short_chars=int(os.getenv("LLM_SMALL_MAX_CHARS", "40")),
+            max_p95=float(os.getenv("LLM_MODEL_MAX_P95", "15")),
+        )
+
+    def classify(self, text):
+        text = text.strip()
+        if len(text) > self.short_chars or "\n" in text or QUESTION_RE.search(text):
+            return LARGE
+        return SMALL
+
+    def route(self, text, profile=None):
+        """
+        Route for a chat message: {"tier", "models", "max_tokens", "temperature", "reasoning"}.
+        """
+        profile = profile or {}
+        large = profile.get("model") or self.large
+        small = profile.get("small_model", self.small)
+        max_tokens = int(profile.get("max_tokens", 800))
+        tier = self.classify(text) if small else LARGE
+        if tier == SMALL:
+            first, second = small, large
+            max_tokens = min(max_tokens, self.small_max_tokens)
+        else:
+            first, second = large, small
+        models = self.chain([first, second, *self.fallbacks])
+        LLM_ROUTES.labels(models[0], tier).inc()
+        return {
+            "tier": tier,
+            "models": models,
+            "max_tokens": max_tokens,
+            "temperature": float(profile.get("temperature", 0.9)),
+            "reasoning": bool(profile.get("reasoning", os.getenv("LLM_REASONING", "0") == "1")),
+        }
+
+    def chain(self, models):
+        """
+        Models in order without duplicates, degraded ones moved to the back.
+        """
+        unique = list(dict.fromkeys(m for m in models if m))
+        return [m for m in unique if not self.degraded(m)] + [m for m in unique if self.degraded(m)]
+
+    def degraded(self, model):
+        stats = self.stats.get(model)
+        if stats is None:
+            return False
+        snapshot = stats.snapshot()
+        if snapshot["count"] < self.min_samples:
+            return False
+        if snapshot["error_rate"] > self.max_error_rate:
+            return True
+        return snapshot["p95"] is not None and snapshot["p95"] > self.max_p95
+
+    def observe(self, model, seconds=None, error_kind=None):
+        """
+        Records one finished call: its latency on success, or the error kind on failure.
+        """
+        stats = self.stats.get(model)
+        if stats is None:
+            stats = self.stats[model] = ModelStats(self.window)
+        if error_kind is None:
+            stats.observe(seconds)
+            LLM_MODEL_SECONDS.labels(model).observe(seconds)
+        else:
+            stats.observe(None)
+            LLM_MODEL_ERRORS.labels(model, error_kind).inc()
+
+    def messages_for(self, model, messages, reasoning):
+        """
+        `messages` with the model's switch for turning reasoning off, if it has one.
+        """
+        if reasoning or not messages or messages[-1]["role"] != "user":
+            return messages
+        switch = next((s for prefix, s in NO_THINK.items() if model.startswith(prefix)), None)
+        if switch is None:
+            return messages
+        last = dict(messages[-1], content=f"{messages[-1]['content']} {switch}")
+        return messages[:-1] + [last]
+
+    def summary(self):
+        return {model: stats.snapshot() for model, stats in sorted(self.stats.items())}
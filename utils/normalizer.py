@@ -0,0 +1,177 @@
+import re
+
+# Letters plus combining diacritics, so decomposed (NFD) Vietnamese text such as
+# "ví" still counts as a single word instead of being split at the accent.
+WORD_RE = re.compile(r"[\w\u0300-\u036f]+")
+
+
+def legacy_normalize(text, abbreviations):
+    """
+    Reference implementation: one regex per entry, applied in dictionary order.
+    Kept for build-time resolution and for equivalence checks in benchmarks.
+    """
+    if not text:
+        return ""
+    for abbr, full in abbreviations.items():
+        pattern = re.compile(r'\b' + re.escape(abbr) + r'\b', re.IGNORECASE)
+        text = pattern.sub(full, text)
+    return text
+
+
+class AbbreviationNormalizer:
+    """
+    Compiled abbreviation expander built once per dictionary.
+
+    Input is scanned word by word in a single pass and every word is looked up in
+    a hash table, so per-message cost no longer depends on the dictionary size.
+    The old per-entry loop had two quirks that are reproduced here:
+    - entries are applied in dictionary order, so an earlier entry shadows a
+      later phrase that contains it ("k" wins over "k bít");
+    - an expansion is re-scanned by the entries after it ("hn" -> "hôm nay"
+      -> "hôm hôm nay"). Expansions are resolved against later entries at
+      build time, so this costs nothing per message.
+    A later phrase can also match across the edge of an expansion and the text
+    next to it ("hn đi" -> "hôm nay đi" -> "hôm bây giờ đi" with a "nay đi"
+    entry), or lose words to an earlier phrase that starts inside it.
+    Dictionaries where that can happen use the legacy patterns.
+    """
+
+    def __init__(self, abbreviations=None):
+        self.abbreviations = dict(abbreviations or {})
+        self._words = {}
+        self._phrases = {}
+        self._fallback = None
+        self._build()
+
+    def _build(self):
+        items = list(self.abbreviations.items())
+
+        # Entries that don't start and end on a word character (or use regex
+        # templates in their expansion) can't be matched per word; keep the
+        # exact legacy semantics with patterns compiled once.
+        if any(not self._fits(abbr, full) for abbr, full in items) or self._crosses_edges(items):
+            self._fallback = [
+                (re.compile(r'\b' + re.escape(abbr) + r'\b', re.IGNORECASE), full)
+                for abbr, full in items
+            ]
+            return
+
+        # Walk the dictionary backwards so that, when an entry is reached, the
+        # tables hold exactly the entries after it and its expansion can be
+        # resolved with the same scanner used at runtime.
+        for index in range(len(items) - 1, -1, -1):
+            abbr, full = items[index]
+            key = abbr.lower()
+            expansion = self._scan(full)
+
+            words = WORD_RE.findall(key)
+            if len(words) == 1:
+                # Overwriting while walking backwards keeps the first entry on
+                # case-insensitive duplicates, as before
+                self._words[key] = (index, expansion)
+            else:
+                self._phrases.setdefault(words[0], []).insert(0, (index, key, expansion))
+
+        # A phrase that an earlier entry rewrites can never match anymore
+        for first, phrases in list(self._phrases.items()):
+            phrases[:] = [p for p in phrases if not self._shadowed(items, p)]
+            if not phrases:
+                del self._phrases[first]
+
+    def _shadowed(self, items, phrase):
+        index, key, _ = phrase
+        abbr = items[index][0]
+        for match in WORD_RE.finditer(abbr):
+            single = self._words.get(match.group().lower())
+            if single and single[0] < index and items[single[0]][1] != match.group():
+                return True
+        return False
+
+    @staticmethod
+    def _crosses_edges(items):
+        """
+        Whether a phrase could match across the edge of an earlier entry's
+        expansion, or overlap a match of an earlier phrase. Every expanded span
+        starts and ends on the first/last word of some earlier expansion, so a
+        phrase that crosses the end of a span has such a last word before its
+        own last word (and likewise for the start).
+        """
+        firsts, lasts, phrase_firsts = set(), set(), set()
+        wordless = False
+        for abbr, full in items:
+            words = WORD_RE.findall(abbr.lower())
+            if len(words) > 1:
+                if (wordless or lasts.intersection(words[:-1]) or firsts.intersection(words[1:])
+                        or phrase_firsts.intersection(words[1:])):
+                    return True
+                phrase_firsts.add(words[0])
+            expansion = WORD_RE.findall(full.lower())
+            if expansion:
+                firsts.add(expansion[0])
+                lasts.add(expansion[-1])
+            else:
+                # An empty expansion joins the words around it
+                wordless = True
+        return False
+
+    @staticmethod
+    def _fits(abbr, full):
+        if not abbr or "\\" in full:
+            return False
+        return bool(WORD_RE.fullmatch(abbr[0]) and WORD_RE.fullmatch(abbr[-1]))
+
+    def _match_phrase(self, text, lowered, start, word, limit):
+        for index, key, expansion in self._phrases.get(word, ()):
+            if index > limit:
+                break
+            end = start + len(key)
+            if lowered[start:end] != key:
+                continue
+            if end < len(text) and WORD_RE.match(text, end):
+                continue
+            return end, expansion
+        return None
+
+    def normalize(self, text):
+        if not text:
+            return ""
+        if self._fallback is not None:
+            for pattern, full in self._fallback:
+                text = pattern.sub(full, text)
+            return text
+
+        return self._scan(text)
+
+    def _scan(self, text):
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # Rare case-mapping that changes length (e.g. "İ"); offsets would drift
+            return legacy_normalize(text, self.abbreviations)
+
+        parts = []
+        pos = 0
+        for match in WORD_RE.finditer(text):
+            start, end = match.span()
+            if start < pos:
+                continue
+            word = lowered[start:end]
+            single = self._words.get(word)
+            limit = single[0] if single else len(self.abbreviations)
+
+            # Phrases take priority only when they come earlier in the dictionary
+            phrase = self._match_phrase(text, lowered, start, word, limit) if self._phrases else None
+            if phrase:
+                end, expansion = phrase
+            elif single:
+                expansion = single[1]
+            else:
+                continue
+
+            parts.append(text[pos:start])
+            parts.append(expansion)
+            pos = end
+
+        if not parts:
+            return text
+        parts.append(text[pos:])
+        return "".join(parts)
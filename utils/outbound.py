@@ -0,0 +1,230 @@
+import asyncio
+import heapq
+import itertools
+import time
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from utils.key_pool import TokenBucket
+from utils.logger import log
+from utils.metrics import OUTBOUND_QUEUED, OUTBOUND_WAIT_SECONDS, OUTBOUND_RETRY_AFTER, OUTBOUND_COLLAPSED
+from utils.scheduler import current_priority, COMMAND
+
+CHAT_ACTION = "sendChatAction"
+# Telegram shows a chat action for up to 5s; a repeat within this is not needed
+ACTION_TTL = 4.0
+
+
+def _retry_seconds(error):
+    # Read like PTB's AIORateLimiter does; the public attribute warns about its type
+    return error._retry_after.total_seconds()
+
+
+class _Chat:
+    __slots__ = ("bucket", "pending", "busy", "blocked_until", "action_until")
+
+    def __init__(self, per_minute, burst):
+        # Refilled at the rest of the rate, so no 60s window holds more than per_minute sends
+        self.bucket = TokenBucket(per_minute - burst, burst)
+        self.pending = []  # heap of (priority, seq, future)
+        self.busy = False
+        self.blocked_until = 0.0
+        self.action_until = 0.0
+
+    def idle(self, now):
+        return (not self.pending and not self.busy and now >= self.blocked_until
+                and self.bucket.wait_time(self.bucket.capacity, now) <= 0)
+
+
+class OutboundDispatcher(BaseRateLimiter):
+    """
+    Paces everything the bot sends to Telegram (pass to ApplicationBuilder.rate_limiter).
+
+    Requests to a chat go out one at a time in (priority, arrival) order, so
+    the parts of a split reply stay in order and a command reply
+    (scheduler.COMMAND) overtakes queued AI chunks. Each chat has a token
+    bucket (`private_per_minute` or `group_per_minute`) and all chats share a
+    `global_per_second` bucket, which the dispatcher hands to the waiting chat
+    with the best priority. A RetryAfter pauses the chat (everything, for
+    requests without a chat) for as long as Telegram asks and the request is
+    retried, up to `max_retries` times. A typing action is dropped while the
+    previous one is still showing.
+    """
+
+    def __init__(self, global_per_second=30.0, private_per_minute=60, group_per_minute=20,
+                 private_burst=2, group_burst=3, max_retries=3, max_chats=10_000):
+        # A one-second burst; Telegram counts the global limit per second
+        self.global_bucket = TokenBucket(global_per_second * 60, max(1.0, global_per_second))
+        self.private = (private_per_minute, private_burst)
+        self.group = (group_per_minute, group_burst)
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.chats = {}
+        self.blocked_until = 0.0  # set by a RetryAfter on a request without a chat
+        self.queued = 0
+        self._waiting = set()  # chat ids with pending requests
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._pump = None
+
+    async def initialize(self):
+        if self._pump is None:
+            self._pump = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        pump, self._pump = self._pump, None
+        if pump:
+            pump.cancel()
+            try:
+                await pump
+            except asyncio.CancelledError:
+                pass
+        # Whatever is still queued goes out unpaced rather than hanging
+        for chat_id in list(self._waiting):
+            for _, _, future in self.chats[chat_id].pending:
+                if not future.done():
+                    future.set_result(None)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None or self._pump is None:
+            await self._wait_unblocked()
+            return await self._call_unchatted(callback, args, kwargs)
+
+        chat = self._chat(chat_id)
+        if endpoint == CHAT_ACTION:
+            return await self._chat_action(chat, callback, args, kwargs)
+
+        max_retries = self.max_retries if rate_limit_args is None else rate_limit_args
+        priority = current_priority.get()
+        seq = next(self._seq)
+        for attempt in range(max_retries + 1):
+            await self._turn(chat_id, chat, priority, seq)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                delay = _retry_seconds(e)
+                OUTBOUND_RETRY_AFTER.inc()
+                chat.blocked_until = max(chat.blocked_until, time.monotonic() + delay + 0.1)
+                if attempt == max_retries:
+                    raise
+                log.warning(f"Flood control on chat {chat_id}, retrying in {delay:.0f}s")
+            finally:
+                chat.busy = False
+                self._wakeup.set()
+
+    async def _call_unchatted(self, callback, args, kwargs):
+        try:
+            return await callback(*args, **kwargs)
+        except RetryAfter as e:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + _retry_seconds(e) + 0.1)
+            OUTBOUND_RETRY_AFTER.inc()
+            raise
+
+    async def _wait_unblocked(self):
+        delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _chat_action(self, chat, callback, args, kwargs):
+        # Cosmetic: skipped rather than queued when it would be redundant or late
+        now = time.monotonic()
+        if now < chat.action_until or now < chat.blocked_until or chat.pending:
+            OUTBOUND_COLLAPSED.inc()
+            return True
+        chat.action_until = now + ACTION_TTL
+        try:
+            return await callback(*args, **kwargs)
+        except RetryAfter as e:
+            chat.blocked_until = max(chat.blocked_until, time.monotonic() + _retry_seconds(e) + 0.1)
+            OUTBOUND_RETRY_AFTER.inc()
+            return True
+
+    def _chat(self, chat_id):
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            if len(self.chats) >= self.max_chats:
+                now = time.monotonic()
+                self.chats = {k: c for k, c in self.chats.items() if not c.idle(now)}
+            # Channel usernames ("@name") are limited like groups
+            private = isinstance(chat_id, int) and chat_id > 0
+            chat = self.chats[chat_id] = _Chat(*(self.private if private else self.group))
+        return chat
+
+    async def _turn(self, chat_id, chat, priority, seq):
+        """
+        Waits until the dispatcher grants this request its chat and a global token.
+        """
+        if self._pump is None:
+            return  # shut down; nothing paces requests any more
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(chat.pending, (priority, seq, future))
+        self._waiting.add(chat_id)
+        self.queued += 1
+        OUTBOUND_QUEUED.inc()
+        self._wakeup.set()
+        queued_at = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the caller gave up
+                chat.busy = False
+            else:
+                chat.pending = [item for item in chat.pending if item[2] is not future]
+                heapq.heapify(chat.pending)
+                if not chat.pending:
+                    self._waiting.discard(chat_id)
+            self._wakeup.set()
+            raise
+        finally:
+            self.queued -= 1
+            OUTBOUND_QUEUED.dec()
+        OUTBOUND_WAIT_SECONDS.labels("command" if priority == COMMAND else "text").observe(
+            time.monotonic() - queued_at
+        )
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._dispatch()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self):
+        """
+        Grants every request that may go now; returns seconds until the next
+        one might, or None to sleep until woken.
+        """
+        while True:
+            now = time.monotonic()
+            best = None
+            next_in = None
+            for chat_id in self._waiting:
+                chat = self.chats[chat_id]
+                if chat.busy:
+                    continue
+                wait = max(chat.bucket.wait_time(1, now), chat.blocked_until - now)
+                if wait > 0:
+                    next_in = wait if next_in is None else min(next_in, wait)
+                    continue
+                if best is None or chat.pending[0][:2] < best[1].pending[0][:2]:
+                    best = (chat_id, chat)
+            if best is None:
+                return next_in
+
+            wait = max(self.global_bucket.wait_time(1, now), self.blocked_until - now)
+            if wait > 0:
+                return wait if next_in is None else min(next_in, wait)
+
+            chat_id, chat = best
+            _, _, future = heapq.heappop(chat.pending)
+            if not chat.pending:
+                self._waiting.discard(chat_id)
+            if future.done():
+                continue  # its caller was cancelled
+            chat.busy = True
+            chat.bucket.take(1, now)
+            self.global_bucket.take(1, now)
+            future.set_result(None)
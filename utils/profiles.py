@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from utils.logger import log
+
+DEFAULT_PROMPT = "Bạn là một trợ lý ảo thân thiện."
+
+
+def render_system_prompt(profile):
+    rules = "\n".join([f"- {r}" for r in profile.get("rules", [])])
+
+    return (
+        f"{profile.get('context', '')}\n\n"
+        f"Tên: {profile.get('name', 'Chatbot')}\n"
+        f"Tính cách: {profile.get('personality', 'Friendly')}\n\n"
+        f"Quy tắc:\n{rules}\n\n"
+        f"Phong cách: {profile.get('language_style', 'Natural')}\n"
+    )
+
+
+class ProfileRegistry:
+    """
+    Profiles from data/profiles/*.json, parsed once with their rendered system prompt.
+
+    A cached entry is re-read only when its file's mtime changes. mtimes are
+    checked at most every `check_interval` seconds, so the chat path normally
+    does no file I/O at all. reload() drops everything immediately.
+    """
+
+    def __init__(self, folder="data/profiles", check_interval=5.0):
+        self.folder = Path(folder)
+        self.check_interval = check_interval
+        self._entries = {}  # id -> {"mtime", "data", "prompt"}
+        self._checked = {}  # id -> monotonic time of the last mtime check
+        self._listed_at = None
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id):
+        return self.folder / f"{profile_id}.json"
+
+    def _read(self, profile_id):
+        path = self._path(profile_id)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self._entries.pop(profile_id, None)
+            return None
+
+        entry = self._entries.get(profile_id)
+        if entry and entry["mtime"] == mtime:
+            return entry
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            log.error(f"Failed to load profile {profile_id}: {e}")
+            self._entries.pop(profile_id, None)
+            return None
+
+        entry = {"mtime": mtime, "data": data, "prompt": render_system_prompt(data)}
+        self._entries[profile_id] = entry
+        return entry
+
+    def _entry(self, profile_id):
+        now = time.monotonic()
+        with self._lock:
+            last = self._checked.get(profile_id)
+            if last is not None and now - last < self.check_interval:
+                return self._entries.get(profile_id)
+            self._checked[profile_id] = now
+            return self._read(profile_id)
+
+    def get(self, profile_id):
+        entry = self._entry(profile_id)
+        return entry["data"] if entry else None
+
+    def prompt(self, profile_id):
+        """
+        Rendered system prompt for a profile, falling back to default.
+        """
+        entry = self._entry(profile_id) or self._entry("default")
+        return entry["prompt"] if entry else DEFAULT_PROMPT
+
+    def list(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._listed_at is None or now - self._listed_at >= self.check_interval:
+                self._listed_at = now
+                found = {file.stem for file in self.folder.glob("*.json")} if self.folder.exists() else set()
+                for profile_id in list(self._entries):
+                    if profile_id not in found:
+                        del self._entries[profile_id]
+                for profile_id in found:
+                    self._checked[profile_id] = now
+                    self._read(profile_id)
+
+            return [
+                {
+                    "id": profile_id,
+                    "name": entry["data"].get("name", profile_id),
+                    "description": entry["data"].get("description", "Không có mô tả"),
+                }
+                for profile_id, entry in sorted(self._entries.items())
+            ]
+
+    def reload(self):
+        with self._lock:
+            self._entries.clear()
+            self._checked.clear()
+            self._listed_at = None
+        return self.list()
@@ -0,0 +1,119 @@
+import asyncio
+import collections
+import os
+import sys
+import httpx
+from utils.key_pool import status_code
+
+# What went wrong with an LLM call, decided by exception type and HTTP status
+AUTH = "auth"
+RATE_LIMIT = "rate_limit"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+SERVER = "server"
+CLIENT = "client"
+UNKNOWN = "unknown"
+
+# Worth another attempt on a different key
+RETRYABLE = {AUTH, RATE_LIMIT, TIMEOUT, CONNECTION, SERVER}
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    def __init__(self, message="Hết thời gian chờ AI trả lời"):
+        super().__init__(message)
+
+
+def classify(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return TIMEOUT
+    code = status_code(error)
+    if code is not None:
+        if code in (401, 403):
+            return AUTH
+        if code == 429:
+            return RATE_LIMIT
+        if code == 408:
+            return TIMEOUT
+        return SERVER if code >= 500 else CLIENT
+    # The SDK is imported lazily; if it isn't loaded this can't be one of its errors
+    sdk = sys.modules.get("cerebras.cloud.sdk")
+    if sdk is not None:
+        if isinstance(error, sdk.APITimeoutError):
+            return TIMEOUT
+        if isinstance(error, sdk.APIConnectionError):
+            return CONNECTION
+    if isinstance(error, httpx.TimeoutException):
+        return TIMEOUT
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return CONNECTION
+    return UNKNOWN
+
+
+class RequestPolicy:
+    """
+    Time limits for LLM calls: an overall deadline per chat, a timeout per
+    attempt, and when hedging is on, the delay after which a backup request
+    goes to a second key.
+
+    The hedge delay is the `hedge_quantile` of recent successful attempts, so
+    only the slowest few percent are duplicated, and at most `max_hedge_ratio`
+    of all requests are ever hedged.
+    """
+
+    def __init__(self, deadline=60.0, attempt_timeout=30.0, hedge=False, hedge_quantile=0.95,
+                 min_hedge_delay=0.5, max_hedge_ratio=0.1, window=200, min_samples=20):
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.window = window
+        self.latencies = {}  # model -> recent successful attempt latencies
+        self.requests = 0
+        self.hedges = 0
+
+    def deadline_from_now(self):
+        return asyncio.get_running_loop().time() + self.deadline
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            deadline=float(os.getenv("LLM_DEADLINE", "60")),
+            attempt_timeout=float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30")),
+            hedge=os.getenv("LLM_HEDGE", "0") == "1",
+            max_hedge_ratio=float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1")),
+        )
+
+    def remaining(self, deadline):
+        """
+        Seconds left until `deadline` (event loop time); raises DeadlineExceeded once it has passed.
+        """
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            raise DeadlineExceeded()
+        return remaining
+
+    def attempt_budget(self, deadline):
+        return min(self.attempt_timeout, self.remaining(deadline))
+
+    def observe(self, model, seconds):
+        latencies = self.latencies.get(model)
+        if latencies is None:
+            latencies = self.latencies[model] = collections.deque(maxlen=self.window)
+        latencies.append(seconds)
+
+    def hedge_delay(self, model):
+        """
+        Seconds to wait before hedging this request to `model`, or None to not hedge it.
+        """
+        self.requests += 1
+        latencies = self.latencies.get(model, ())
+        if not self.hedge or len(latencies) < self.min_samples:
+            return None
+        if self.hedges >= self.max_hedge_ratio * self.requests:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))
+        return max(self.min_hedge_delay, ordered[index])
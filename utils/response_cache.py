@@ -0,0 +1,87 @@
+import hashlib
+import random
+import time
+from collections import OrderedDict
+from utils.logger import log
+from utils.metrics import RESPONSE_CACHE
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of replies to short, repeated messages.
+
+    Entries are keyed by profile, normalized input and optionally a fingerprint
+    of the last turns. Up to `variants` different replies are collected per key
+    before it starts serving hits; a hit then returns one of them at random so
+    repeated openers don't always get the same answer.
+    """
+
+    def __init__(self, max_entries=2000, ttl=6 * 3600, variants=3, max_input_chars=40,
+                 use_history=False, history_turns=2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = variants
+        self.max_input_chars = max_input_chars
+        self.use_history = use_history
+        self.history_turns = history_turns
+
+        self._entries = OrderedDict()  # key -> {"created": ts, "replies": [...]}
+
+    def key(self, profile, normalized_input, history=None):
+        """
+        Cache key for a message, or None when the message is not cacheable.
+        """
+        text = " ".join(normalized_input.lower().split())
+        if not text or len(text) > self.max_input_chars:
+            return None
+
+        fingerprint = ""
+        if self.use_history and history:
+            recent = "\n".join(content for _, content in history[-self.history_turns:])
+            fingerprint = hashlib.sha1(recent.encode("utf-8")).hexdigest()[:12]
+        return f"{profile}|{fingerprint}|{text}"
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry["created"] > self.ttl:
+            del self._entries[key]
+            entry = None
+
+        if entry is None or len(entry["replies"]) < self.variants:
+            RESPONSE_CACHE.labels("miss").inc()
+            return None
+
+        self._entries.move_to_end(key)
+        RESPONSE_CACHE.labels("hit").inc()
+        return random.choice(entry["replies"])
+
+    def put(self, key, reply):
+        if not reply or reply == "...":
+            return
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = {"created": time.time(), "replies": []}
+            self._entries[key] = entry
+        if reply not in entry["replies"] and len(entry["replies"]) < self.variants:
+            entry["replies"].append(reply)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def load(self, store):
+        """
+        Loads entries persisted by save() in any worker process (a ConversationStore).
+        """
+        data = store.load_responses(since=time.time() - self.ttl, limit=self.max_entries)
+        for key, entry in data.items():
+            if entry["replies"]:
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._entries:
+            log.info(f"Loaded {len(self._entries)} cached responses")
+
+    def save(self, store):
+        # Upserted, so workers saving at shutdown add to each other's entries
+        store.save_responses(self._entries)
@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from telegram.ext import BaseUpdateProcessor
+from utils.logger import log, correlation_id
+from utils.metrics import SCHEDULER_QUEUED, SCHEDULER_SHED
+
+# Lower runs first
+COMMAND = 0
+TEXT = 1
+
+BUSY_TEXT = "⏳ Bot đang quá tải, bạn thử lại sau ít phút nhé!"
+
+_held_turn = contextvars.ContextVar("scheduler_turn", default=None)
+# Priority of the update being handled; outbound sends are paced by it
+current_priority = contextvars.ContextVar("update_priority", default=TEXT)
+
+
+class Busy(Exception):
+    """
+    Raised by ChatScheduler.run when a job is shed instead of queued.
+    """
+
+
+class _Turn:
+    __slots__ = ("chat_id", "active")
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.active = True
+
+
+class _Lane:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class ChatScheduler:
+    """
+    Runs chat jobs concurrently across chats but one at a time within a chat.
+
+    At most `max_concurrent` jobs run at once; when a slot frees up, queued
+    commands go before queued chat text. Text jobs are shed (Busy) instead of
+    queued once `max_queue` jobs are waiting overall or `max_chat_queue` in
+    one chat, and dropped if they waited longer than `max_wait` seconds, which
+    keeps tail latency bounded when a group floods the bot.
+    """
+
+    def __init__(self, max_concurrent=8, max_queue=100, max_chat_queue=10, max_wait=60.0,
+                 busy_interval=30.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_chat_queue = max_chat_queue
+        self.max_wait = max_wait
+        self.busy_interval = busy_interval
+        self.running = 0
+        self.queued = 0
+        self.shed = 0
+        self._lanes = {}
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._busy_sent = {}
+
+    async def run(self, chat_id, job, priority=TEXT):
+        """
+        Awaits coroutine `job` in its turn for `chat_id`. Raises Busy if it was shed.
+        """
+        turn = _held_turn.get()
+        if turn is not None and turn.active and turn.chat_id == chat_id:
+            # Already inside this chat's turn (e.g. a handler scheduling its own work)
+            return await job
+
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            lane = self._lanes[chat_id] = _Lane()
+        if priority != COMMAND and (self.queued >= self.max_queue or lane.pending >= self.max_chat_queue):
+            self._shed(job)
+            raise Busy()
+
+        queued_at = time.monotonic()
+        lane.pending += 1
+        self._set_queued(1)
+        slot = False
+        try:
+            async with lane.lock:
+                await self._acquire_slot(priority)
+                slot = True
+                self._set_queued(-1)
+                lane.pending -= 1
+                if priority != COMMAND and time.monotonic() - queued_at > self.max_wait:
+                    self._shed(job)
+                    raise Busy()
+
+                turn = _Turn(chat_id)
+                token = _held_turn.set(turn)
+                try:
+                    return await job
+                finally:
+                    turn.active = False
+                    _held_turn.reset(token)
+        finally:
+            if slot:
+                self._release_slot()
+            else:
+                # Cancelled while waiting
+                self._set_queued(-1)
+                lane.pending -= 1
+                job.close()
+            if lane.pending == 0 and not lane.lock.locked() and self._lanes.get(chat_id) is lane:
+                del self._lanes[chat_id]
+
+    async def _acquire_slot(self, priority):
+        if self.running < self.max_concurrent and not self._waiters:
+            self.running += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just as we were cancelled
+                self._release_slot()
+            raise
+
+    def _release_slot(self):
+        # Hand the slot straight to the next waiter so nobody can jump the queue
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    def _set_queued(self, delta):
+        self.queued += delta
+        SCHEDULER_QUEUED.set(self.queued)
+
+    def _shed(self, job):
+        job.close()
+        self.shed += 1
+        SCHEDULER_SHED.inc()
+
+    async def reply_busy(self, message):
+        """
+        Cheap overload reply, sent at most once per chat every `busy_interval` seconds.
+        """
+        if message is None:
+            return
+        now = time.monotonic()
+        chat_id = message.chat.id
+        if now - self._busy_sent.get(chat_id, float("-inf")) < self.busy_interval:
+            return
+        if len(self._busy_sent) > 10_000:
+            self._busy_sent = {k: t for k, t in self._busy_sent.items() if now - t < self.busy_interval}
+        self._busy_sent[chat_id] = now
+        try:
+            await message.reply_text(BUSY_TEXT)
+        except Exception as e:
+            log.warning(f"Failed to send busy reply: {e}")
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Feeds Telegram updates through a ChatScheduler (pass to ApplicationBuilder.concurrent_updates).
+
+    Commands get COMMAND priority except `chat_commands`, which do a full LLM
+    round trip and queue like normal text.
+    """
+
+    def __init__(self, scheduler, chat_commands=("chat",), max_updates=4096):
+        # PTB's own semaphore only caps how many update tasks may exist at once
+        super().__init__(max_updates)
+        self.scheduler = scheduler
+        self.chat_commands = {f"/{name}" for name in chat_commands}
+
+    def priority(self, message):
+        text = getattr(message, "text", None) or ""
+        if not text.startswith("/"):
+            return TEXT
+        command = text.split(maxsplit=1)[0].split("@", 1)[0]
+        return TEXT if command in self.chat_commands else COMMAND
+
+    async def do_process_update(self, update, coroutine):
+        # Each update runs in its own task, so this tags only its log records
+        correlation_id.set(getattr(update, "update_id", None))
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            await coroutine
+            return
+        message = getattr(update, "effective_message", None)
+        priority = self.priority(message)
+        current_priority.set(priority)
+        try:
+            await self.scheduler.run(chat.id, coroutine, priority)
+        except Busy:
+            await self.scheduler.reply_busy(message)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
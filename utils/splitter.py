@@ -0,0 +1,88 @@
+import unicodedata
+
+# Telegram's hard limit is 4096 UTF-16 code units; keep a small margin
+MAX_MESSAGE_LENGTH = 4000
+
+SEPARATORS = (
+    ("\n\n",),                        # paragraph
+    ("\n",),                          # line
+    (". ", "! ", "? ", "… ", "; "),   # sentence
+    (" ",),                           # word
+)
+
+
+def utf16_len(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _hard_cut(text, start, end):
+    # Don't separate a letter from its combining accents (decomposed Vietnamese)
+    cut = end
+    while start + 1 < cut < len(text) and unicodedata.combining(text[cut]):
+        cut -= 1
+    return cut
+
+
+def next_cut(text, start=0, max_length=MAX_MESSAGE_LENGTH, astral=True):
+    """
+    End offset of the chunk that starts at `start`: the last paragraph, line,
+    sentence or word boundary that keeps the chunk within max_length UTF-16
+    units, or a hard cut when there is none. Only looks at one window of text,
+    so splitting a whole reply stays linear. Pass astral=False when the text is
+    known to have no astral characters, to skip measuring in UTF-16.
+    """
+    window = max_length
+    while True:
+        end = start + window
+        if end >= len(text):
+            end = len(text)
+            if not astral or utf16_len(text[start:end]) <= max_length:
+                return end
+
+        cut = None
+        for group in SEPARATORS:
+            ends = []
+            for sep in group:
+                idx = text.rfind(sep, start, end)
+                if idx > start:
+                    ends.append(idx + len(sep))
+            if ends:
+                cut = max(ends)
+                break
+        if cut is None:
+            cut = _hard_cut(text, start, end)
+
+        if not astral:
+            return cut
+        excess = utf16_len(text[start:cut]) - max_length
+        if excess <= 0:
+            return cut
+        # Astral characters (emoji) take two units; shrink the window and retry
+        window = max(1, window - excess)
+
+
+def split_message(text, max_length=MAX_MESSAGE_LENGTH):
+    """
+    Splits text into chunks that each fit in one Telegram message.
+    """
+    # Without emoji and other astral characters UTF-16 length equals len()
+    astral = utf16_len(text) != len(text)
+    chunks = []
+    pos = 0
+    while pos < len(text):
+        end = next_cut(text, pos, max_length, astral)
+        chunk = text[pos:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        pos = end
+    return chunks
+
+
+async def send_chunks(message, chunks):
+    """
+    Sends chunks in order as replies to `message`, back to back.
+    """
+    sent = []
+    for chunk in chunks:
+        sent.append(await message.reply_text(chunk))
+    return sent
@@ -1,6 +1,11 @@
 import json
 import os
+import sqlite3
+import tempfile
+import threading
+import time
 from utils.logger import log
+from utils.metrics import STORAGE_SECONDS
 
 class JsonDB:
     def __init__(self, folder_path="data"):
@@ -27,7 +32,7 @@ class JsonDB:
             return default
             
         try:
-            with open(path, "r", encoding="utf-8") as f:
+            with STORAGE_SECONDS.labels("load", filename).time(), open(path, "r", encoding="utf-8") as f:
                 return json.load(f)
         except Exception as e:
             log.error(f"Failed to load {filename}: {e}")
@@ -35,14 +40,26 @@ class JsonDB:
 
     def save(self, filename, data):
         """
-        Saves data to a JSON file (Atomic-ish write).
+        Saves data to a JSON file atomically.
+        Writes a temp file in the same folder and renames it over the target,
+        so a crash mid-write never leaves a truncated file behind.
         """
         path = self._get_path(filename)
+        tmp_path = None
         try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            with STORAGE_SECONDS.labels("save", filename).time():
+                with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", dir=self.folder_path, suffix=".tmp", delete=False
+                ) as f:
+                    tmp_path = f.name
+                    json.dump(data, f, indent=4, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
         except Exception as e:
             log.error(f"Failed to save {filename}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     def update(self, filename, key, value):
         """
@@ -52,5 +69,188 @@ class JsonDB:
         data[key] = value
         self.save(filename, data)
 
+class ConversationStore:
+    """
+    Per-user conversation turns in SQLite.
+    Turns are appended one row at a time, so a message costs one indexed insert
+    instead of rewriting every user's history. Also holds the small state that
+    worker processes share (chat settings, the persisted response cache), so
+    concurrent writers don't overwrite each other like with a JSON file.
+    """
+
+    def __init__(self, path="data/conversations.db"):
+        self.path = path
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "user_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, "
+            "content TEXT NOT NULL, "
+            "ts REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_turns_user_ts ON turns (user_id, ts)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_settings ("
+            "chat_id TEXT NOT NULL, "
+            "name TEXT NOT NULL, "
+            "value TEXT NOT NULL, "
+            "PRIMARY KEY (chat_id, name))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, "
+            "created REAL NOT NULL, "
+            "replies TEXT NOT NULL)"
+        )
+
+    def append(self, user_id, role, content, ts=None):
+        """
+        Appends a single turn. role is "user" or "assistant".
+        """
+        self.append_many([(user_id, role, content, ts)])
+
+    def append_many(self, turns):
+        """
+        Appends (user_id, role, content, ts) tuples in one transaction.
+        Returns False, with nothing written, when the write failed.
+        """
+        now = time.time()
+        rows = [(str(u), r, c, ts if ts is not None else now) for u, r, c, ts in turns]
+        if not rows:
+            return True
+        try:
+            with STORAGE_SECONDS.labels("append", "conversations").time(), self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT INTO turns (user_id, role, content, ts) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            return True
+        except Exception as e:
+            log.error(f"Failed to append turns: {e}")
+            with self._lock:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+            return False
+
+    def last(self, user_id, limit=20):
+        """
+        Returns the last `limit` turns of a user, oldest first, as (role, content).
+        """
+        try:
+            with STORAGE_SECONDS.labels("last", "conversations").time(), self._lock:
+                rows = self._conn.execute(
+                    "SELECT role, content FROM turns WHERE user_id = ? "
+                    "ORDER BY ts DESC, id DESC LIMIT ?",
+                    (str(user_id), limit),
+                ).fetchall()
+        except Exception as e:
+            log.error(f"Failed to read turns for {user_id}: {e}")
+            return []
+        rows.reverse()
+        return rows
+
+    def migrate_from_json(self, json_db, filename="logs"):
+        """
+        One-time import of the legacy {user_id: ["User: ...", "Bot: ..."]} file.
+        The JSON file is left in place; the migration is recorded in the meta table.
+        """
+        marker = f"migrated:{filename}"
+        with self._lock:
+            done = self._conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone()
+        if done or not os.path.exists(json_db._get_path(filename)):
+            return 0
+
+        legacy = json_db.load(filename, default={})
+        base = time.time()
+        turns = []
+        for user_id, lines in legacy.items():
+            for i, line in enumerate(lines):
+                prefix, _, content = line.partition(": ")
+                role = "assistant" if prefix == "Bot" else "user"
+                # Keep the original order with strictly increasing timestamps
+                turns.append((user_id, role, content, base - len(lines) + i))
+
+        if not self.append_many(turns):
+            return 0  # not marked as migrated, so the next start tries again
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (marker, str(base)))
+        log.info(f"Migrated {len(turns)} turns from {filename}.json to {self.path}")
+        return len(turns)
+
+    def set_chat_setting(self, chat_id, name, value):
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO chat_settings (chat_id, name, value) VALUES (?, ?, ?)",
+                    (str(chat_id), name, value),
+                )
+        except Exception as e:
+            log.error(f"Failed to save {name} for chat {chat_id}: {e}")
+
+    def chat_settings(self, name):
+        """
+        {chat_id: value} of one setting for every chat that has it.
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT chat_id, value FROM chat_settings WHERE name = ?", (name,)
+                ).fetchall()
+        except Exception as e:
+            log.error(f"Failed to read {name} settings: {e}")
+            return {}
+        return dict(rows)
+
+    def save_responses(self, entries):
+        """
+        Upserts {key: {"created": ts, "replies": [...]}} cache entries in one transaction.
+        """
+        rows = [(key, entry["created"], json.dumps(entry["replies"], ensure_ascii=False))
+                for key, entry in entries.items()]
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO response_cache (key, created, replies) VALUES (?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+        except Exception as e:
+            log.error(f"Failed to save cached responses: {e}")
+            with self._lock:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+
+    def load_responses(self, since, limit):
+        """
+        Cache entries created after `since`, up to the newest `limit`, oldest first.
+        Older entries are deleted.
+        """
+        try:
+            with self._lock:
+                self._conn.execute("DELETE FROM response_cache WHERE created < ?", (since,))
+                rows = self._conn.execute(
+                    "SELECT key, created, replies FROM response_cache ORDER BY created DESC LIMIT ?", (limit,)
+                ).fetchall()
+        except Exception as e:
+            log.error(f"Failed to load cached responses: {e}")
+            return {}
+        rows.reverse()
+        return {key: {"created": created, "replies": json.loads(replies)} for key, created, replies in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
 # Global Instance
 db = JsonDB(folder_path="data")
+conversations = ConversationStore(path="data/conversations.db")
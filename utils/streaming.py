@@ -0,0 +1,143 @@
+import time
+from utils.logger import log
+from utils.splitter import MAX_MESSAGE_LENGTH, next_cut, utf16_len
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+
+def _partial_suffix(text, tag):
+    """
+    Length of the longest suffix of text that is a proper prefix of tag.
+    """
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class ThinkFilter:
+    """
+    Removes <think>...</think> blocks from a token stream, including tags that
+    are split across chunks. Text that could still be the start of a tag is
+    held back until the next chunk decides it.
+    """
+
+    def __init__(self):
+        self.inside = False
+        self.buffer = ""
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        out = []
+        while self.buffer:
+            if self.inside:
+                idx = self.buffer.find(THINK_CLOSE)
+                if idx < 0:
+                    keep = _partial_suffix(self.buffer, THINK_CLOSE)
+                    self.buffer = self.buffer[len(self.buffer) - keep:]
+                    break
+                self.buffer = self.buffer[idx + len(THINK_CLOSE):]
+                self.inside = False
+            else:
+                idx = self.buffer.find(THINK_OPEN)
+                if idx < 0:
+                    keep = _partial_suffix(self.buffer, THINK_OPEN)
+                    out.append(self.buffer[:len(self.buffer) - keep])
+                    self.buffer = self.buffer[len(self.buffer) - keep:]
+                    break
+                out.append(self.buffer[:idx])
+                self.buffer = self.buffer[idx + len(THINK_OPEN):]
+                self.inside = True
+        return "".join(out)
+
+    def finish(self):
+        # An unterminated think block is dropped
+        rest = "" if self.inside else self.buffer
+        self.buffer = ""
+        return rest
+
+
+class StreamingReply:
+    """
+    Shows a completion while it is generated by editing one Telegram message.
+
+    Edits are throttled to `edit_interval` seconds (Telegram rejects faster
+    edits) and a new message is started whenever the text grows past
+    `max_length`.
+    """
+
+    def __init__(self, message, clean=None, edit_interval=1.0, max_length=MAX_MESSAGE_LENGTH, placeholder="..."):
+        self.message = message
+        self.clean = clean or (lambda text: text)
+        self.edit_interval = edit_interval
+        self.max_length = max_length
+        self.placeholder = placeholder
+
+        self.think = ThinkFilter()
+        self.raw = []
+        self.sent = []  # finished Telegram messages
+        self.current = None
+        self.committed = 0  # chars of cleaned text already finalized in earlier messages
+        self.shown = None
+        self.last_edit = 0.0
+
+    async def start(self):
+        self.current = await self.message.reply_text(self.placeholder)
+        self.last_edit = time.monotonic()
+
+    async def feed(self, delta):
+        visible = self.think.feed(delta)
+        if visible:
+            self.raw.append(visible)
+        if time.monotonic() - self.last_edit >= self.edit_interval:
+            await self._render(final=False)
+
+    async def finish(self):
+        """
+        Shows the final text and returns it (cleaned, without think blocks).
+        """
+        rest = self.think.finish()
+        if rest:
+            self.raw.append(rest)
+        return await self._render(final=True)
+
+    async def _edit(self, text):
+        if text == self.shown:
+            return
+        try:
+            await self.current.edit_text(text)
+            self.shown = text
+        except Exception as e:
+            # Skipped edits are caught up by the next one
+            log.warning(f"Stream edit failed: {e}")
+        self.last_edit = time.monotonic()
+
+    async def _render(self, final):
+        text = self.clean("".join(self.raw))
+        if not final and text.endswith("~"):
+            # Could be the first half of a "~~" the cleaner removes
+            text = text[:-1]
+
+        while utf16_len(text[self.committed:]) > self.max_length:
+            cut = next_cut(text, self.committed, self.max_length)
+            await self._edit(text[self.committed:cut].strip())
+            self.sent.append(self.current)
+            self.committed = cut
+            self.current = await self.message.reply_text(self.placeholder)
+            self.shown = None
+
+        tail = text[self.committed:].strip()
+        if tail:
+            await self._edit(tail)
+        elif final and self.committed:
+            # Everything fit in earlier messages; drop the trailing placeholder
+            try:
+                await self.current.delete()
+            except Exception as e:
+                log.warning(f"Failed to delete placeholder: {e}")
+        elif final:
+            await self._edit("...")
+
+        full = text.strip()
+        return full or "..."
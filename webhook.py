@@ -0,0 +1,92 @@
+import asyncio
+import hmac
+import signal
+from aiohttp import web
+from telegram import Update
+from keep_alive import HOME_PAGE
+from utils.logger import log
+from utils.metrics import health_status, render_metrics, register_health_check
+
+WEBHOOK_PATH = "/telegram"
+
+
+def create_web_app(application, secret):
+    """
+    aiohttp app serving Telegram webhooks plus the keep-alive, health and metrics pages.
+    """
+
+    async def telegram_update(request):
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, secret):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except Exception:
+            return web.Response(status=400)
+
+        # Hand off to the Application's own queue; reply to Telegram right away
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return web.Response()
+
+    async def home(request):
+        return web.Response(text=HOME_PAGE, content_type="text/html")
+
+    async def health(request):
+        ready, checks = health_status()
+        if ready:
+            return web.json_response({"status": "ok", "bot": "running", "checks": checks})
+        return web.json_response({"status": "degraded", "bot": "not ready", "checks": checks}, status=503)
+
+    async def metrics(request):
+        body, content_type = render_metrics()
+        return web.Response(body=body, headers={"Content-Type": content_type})
+
+    web_app = web.Application()
+    web_app.router.add_post(WEBHOOK_PATH, telegram_update)
+    web_app.router.add_get("/", home)
+    web_app.router.add_get("/health", health)
+    web_app.router.add_get("/metrics", metrics)
+    return web_app
+
+
+async def run_webhook(application, url, port, secret):
+    """
+    Runs the bot on webhooks: one event loop for Telegram updates and the web pages.
+    Mirrors Application.run_polling's lifecycle, including post_init/post_shutdown.
+    """
+    runner = web.AppRunner(create_web_app(application, secret))
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+
+        await application.bot.set_webhook(
+            url=url.rstrip("/") + WEBHOOK_PATH,
+            secret_token=secret,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        await application.start()
+
+        await runner.setup()
+        site = web.TCPSite(runner, "0.0.0.0", port)
+        await site.start()
+        register_health_check("webhook", lambda: application.running)
+        log.info(f"Webhook server listening on port {port}")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass  # Windows
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,139 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+from telegram import Update
+from telegram.ext import ApplicationBuilder, TypeHandler
+from utils.key_pool import KeyLedger
+from utils.logger import log
+from utils.metrics import register_health_check
+from utils.storage import db, conversations
+
+# How often an idle worker checks that the front process is still alive
+POLL_INTERVAL = 1.0
+
+
+def shard_for(chat_id, workers):
+    """
+    Worker index owning a chat; every update of a chat goes to the same worker, in order.
+    """
+    return abs(chat_id) % workers
+
+
+class WorkerPool:
+    """
+    N worker processes, each running the full bot (ChatbotHandler, scheduler,
+    history cache) for the chats routed to it. API key budgets are shared
+    through a KeyLedger so the workers together respect each key's limits.
+    """
+
+    def __init__(self, workers):
+        self.context = multiprocessing.get_context("spawn")
+        self.ledger = KeyLedger(context=self.context)
+        self.queues = [self.context.Queue() for _ in range(workers)]
+        self.processes = []
+
+    def start(self):
+        # Import legacy logs once here instead of racing in every worker
+        conversations.migrate_from_json(db, "logs")
+        for index in range(len(self.queues)):
+            process = self.context.Process(
+                target=worker_main,
+                args=(index, self.queues, self.ledger),
+                name=f"bot-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+        log.info(f"Started {len(self.processes)} worker processes")
+
+    def alive(self):
+        return bool(self.processes) and all(p.is_alive() for p in self.processes)
+
+    async def route(self, update: Update, context):
+        chat = update.effective_chat
+        index = shard_for(chat.id, len(self.queues)) if chat else 0
+        self.queues[index].put(("update", update.to_dict()))
+
+    def stop(self, timeout=15.0):
+        for inbox in self.queues:
+            inbox.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                log.warning(f"{process.name} did not stop in {timeout:.0f}s, terminating")
+                process.terminate()
+
+
+def build_front(token, workers, updater=True, api_url=""):
+    """
+    Application for the front process: receives updates (polling or webhook) and routes them.
+    """
+    pool = WorkerPool(workers)
+
+    async def post_init(application):
+        pool.start()
+        register_health_check("workers", pool.alive)
+
+    async def post_shutdown(application):
+        await asyncio.to_thread(pool.stop)
+
+    builder = ApplicationBuilder().token(token).post_init(post_init).post_shutdown(post_shutdown)
+    if api_url:
+        builder = builder.base_url(api_url.rstrip("/") + "/bot")
+    if not updater:
+        builder = builder.updater(None)
+    app = builder.build()
+    app.add_handler(TypeHandler(Update, pool.route))
+    return app
+
+
+def worker_main(index, queues, ledger):
+    # Ctrl+C reaches the whole process group; let the front decide when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve(index, queues, ledger))
+
+
+async def _serve(index, queues, ledger):
+    from main import build_application
+
+    app, chatbot = build_application(updater=False, ledger=ledger)
+    inbox = queues[index]
+
+    def broadcast(kind, value):
+        for i, sibling in enumerate(queues):
+            if i != index:
+                sibling.put(("control", kind, value))
+
+    chatbot.broadcast = broadcast
+    parent = os.getppid()
+
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        log.info(f"Worker {index} ready (pid {os.getpid()})")
+
+        while True:
+            try:
+                item = await asyncio.to_thread(inbox.get, True, POLL_INTERVAL)
+            except queue.Empty:
+                if os.getppid() != parent:
+                    log.warning(f"Worker {index} lost its front process, exiting")
+                    break
+                continue
+            if item is None:
+                break
+            if item[0] == "update":
+                await app.update_queue.put(Update.de_json(item[1], app.bot))
+            else:
+                chatbot.apply_control(item[1], item[2])
+    finally:
+        # stop() waits for updates already queued or running
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)